@@ -0,0 +1,135 @@
+"""Running totals and history rollups kept in step with the items table.
+
+Every item contributes its spend (price x quantity, in integer cents so
+repeated add/subtract never drifts) and its per-serving nutrients x quantity
+to four tables: its list's totals, its purchase week, its category and its
+product. `apply` is called inside the same transaction as the item write, so
+queries read a handful of precomputed rows instead of scanning history.
+"""
+from datetime import datetime, timedelta, timezone
+
+from .schemas import NUTRIENTS
+
+MEASURES = ('item_count', 'quantity', 'spend_cents', *NUTRIENTS)
+
+UNCATEGORIZED = 'Uncategorized'
+
+_MEASURE_COLUMNS = ',\n    '.join(
+    f'{measure} {"INTEGER" if measure in ("item_count", "quantity", "spend_cents") else "REAL"} NOT NULL DEFAULT 0'
+    for measure in MEASURES
+)
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS list_totals (
+    list_id INTEGER PRIMARY KEY REFERENCES lists (id) ON DELETE CASCADE,
+    {_MEASURE_COLUMNS}
+);
+CREATE TABLE IF NOT EXISTS weekly_rollup (
+    week TEXT PRIMARY KEY,
+    {_MEASURE_COLUMNS}
+);
+CREATE TABLE IF NOT EXISTS category_rollup (
+    category TEXT PRIMARY KEY,
+    {_MEASURE_COLUMNS}
+);
+CREATE TABLE IF NOT EXISTS product_rollup (
+    product TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    {_MEASURE_COLUMNS}
+);
+CREATE INDEX IF NOT EXISTS product_rollup_spend ON product_rollup (spend_cents DESC);
+CREATE INDEX IF NOT EXISTS product_rollup_quantity ON product_rollup (quantity DESC);
+"""
+
+# Rollup table -> key column; list_totals is handled separately
+ROLLUPS = {'weekly_rollup': 'week', 'category_rollup': 'category', 'product_rollup': 'product'}
+
+TOP_ITEM_ORDER = {'spend': 'spend_cents', 'quantity': 'quantity', 'purchases': 'item_count'}
+
+
+def week_of(timestamp):
+    """ISO week start (Monday, UTC) as YYYY-MM-DD."""
+    day = datetime.fromtimestamp(timestamp, timezone.utc).date()
+    return (day - timedelta(days=day.weekday())).isoformat()
+
+
+def contribution(row):
+    quantity = row['quantity'] or 0
+    return {
+        'item_count': 1,
+        'quantity': quantity,
+        'spend_cents': round((row['price'] or 0) * 100) * quantity,
+        **{nutrient: (row[nutrient] or 0) * quantity for nutrient in NUTRIENTS},
+    }
+
+
+def _upsert(db, table, keys, values, replace=()):
+    columns = [*keys, *values]
+    updates = ', '.join(
+        [f'{measure} = {measure} + excluded.{measure}' for measure in values]
+        + [f'{column} = excluded.{column}' for column in replace]
+    )
+    db.execute(
+        f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({", ".join("?" for _ in columns)}) '
+        f'ON CONFLICT ({next(iter(keys))}) DO UPDATE SET {updates}',
+        (*keys.values(), *values.values()),
+    )
+
+
+def apply(db, row, sign):
+    """Add (`sign=1`) or remove (`sign=-1`) one item row's contribution."""
+    values = {measure: sign * value for measure, value in contribution(row).items()}
+    _upsert(db, 'list_totals', {'list_id': row['list_id']}, values)
+
+    keys = {
+        'weekly_rollup': {'week': week_of(row['purchased_at'] or row['created_at'])},
+        'category_rollup': {'category': row['category'] or UNCATEGORIZED},
+    }
+    name = (row['name'] or '').strip()
+    if name:
+        keys['product_rollup'] = {'product': name.lower(), 'name': name}
+
+    for table, key in keys.items():
+        # Show products under the spelling most recently added
+        replace = ('name',) if table == 'product_rollup' and sign > 0 else ()
+        _upsert(db, table, key, values, replace)
+        if sign < 0:
+            # Drop emptied buckets so float residue cannot accumulate in them
+            column = ROLLUPS[table]
+            db.execute(f'DELETE FROM {table} WHERE {column} = ? AND item_count <= 0', (key[column],))
+
+
+def rebuild(db):
+    """Recompute every rollup from the items table (migrations and checks)."""
+    for table in ('list_totals', *ROLLUPS):
+        db.execute(f'DELETE FROM {table}')
+    db.execute('INSERT INTO list_totals (list_id) SELECT id FROM lists')
+    for row in db.execute('SELECT * FROM items').fetchall():
+        apply(db, row, 1)
+
+
+def _measures(row):
+    result = {'itemCount': row['item_count'], 'quantity': row['quantity'], 'spend': row['spend_cents'] / 100}
+    result.update({nutrient: round(row[nutrient], 2) for nutrient in NUTRIENTS})
+    return result
+
+
+def list_totals(db, list_id):
+    row = db.execute('SELECT * FROM list_totals WHERE list_id = ?', (list_id,)).fetchone()
+    return _measures(row) if row else None
+
+
+def weekly(db, weeks=12):
+    rows = db.execute('SELECT * FROM weekly_rollup ORDER BY week DESC LIMIT ?', (weeks,)).fetchall()
+    return [{'week': row['week'], **_measures(row)} for row in reversed(rows)]
+
+
+def categories(db):
+    rows = db.execute('SELECT * FROM category_rollup ORDER BY spend_cents DESC').fetchall()
+    return [{'category': row['category'], **_measures(row)} for row in rows]
+
+
+def top_items(db, limit=10, by='spend'):
+    order = TOP_ITEM_ORDER[by]
+    rows = db.execute(f'SELECT * FROM product_rollup ORDER BY {order} DESC LIMIT ?', (limit,)).fetchall()
+    return [{'name': row['name'], **_measures(row)} for row in rows]
@@ -0,0 +1,142 @@
+import asyncio
+
+from .images import fingerprint, upload_digest
+from .instrumentation import record_image, stage
+from .preprocess import passthrough, prepare, profile_for
+from .schemas import NUTRIENTS, ItemAnalysis
+
+TASKS = ('product', 'nutrition')
+
+
+def usable(task, result):
+    """Whether a result is worth caching: a product name, or any nutrient amount."""
+    if task == 'product':
+        return bool(result.get('name'))
+    return any(result.get(nutrient) is not None for nutrient in NUTRIENTS)
+
+
+class AnalysisService:
+    """Runs an image through the result cache before falling back to the model.
+
+    An upload is first looked up by the hash of its raw bytes, which costs a
+    read of the file; only when that misses is it decoded and shrunk, and
+    looked up again by its pixels.
+
+    Every identified product is also recorded in `catalogue`, when given, so
+    later add-items can find it by name without a photo.
+    """
+
+    def __init__(self, cache, client, settings, catalogue=None):
+        self.cache = cache
+        self.client = client
+        self.settings = settings
+        self.catalogue = catalogue
+        self.max_distance = {'product': settings.product_phash_distance, 'nutrition': 0}
+
+    def prepare(self, task, stream, mime='image/jpeg'):
+        if not self.settings.preprocess:
+            prepared = passthrough(stream, mime)
+        else:
+            prepared = prepare(stream, profile_for(task, self.settings), self.settings.image_format)
+        record_image('model', len(prepared.data))
+        return prepared
+
+    def _lookup_upload(self, task, stream):
+        """Return `(upload digest, result, status)` for the raw bytes of `stream`."""
+        with stage('cache'):
+            upload, size = upload_digest(stream)
+            result, status = self.cache.get_upload(task, upload)
+        record_image('upload', size)
+        return upload, result, status
+
+    def _lookup(self, task, fp, upload):
+        with stage('cache'):
+            result, status = self.cache.get(task, fp, self.max_distance[task])
+            if status == 'hit':
+                # Same pixels, different file: answer these bytes directly next time
+                self.cache.link(task, upload, fp)
+        return result, status
+
+    def _store(self, task, fp, result, upload):
+        if not usable(task, result):
+            # An empty answer would be served for this photo forever
+            return
+        with stage('persist'):
+            self.cache.put(task, fp, result, upload)
+
+    def _call_model(self, task, prepared, fp, upload):
+        result = self.client.analyze(task, prepared.data_url, prepared.detail)
+        self._store(task, fp, result, upload)
+        return result
+
+    def _record(self, result):
+        if self.catalogue is not None and result.get('name'):
+            with stage('persist'):
+                self.catalogue.record(result)
+
+    def analyze(self, task, stream, mime='image/jpeg'):
+        """Return `(result, cache_status)` for an image file object."""
+        upload, result, status = self._lookup_upload(task, stream)
+        if result is None:
+            prepared = self.prepare(task, stream, mime)
+            fp = fingerprint(prepared.image)
+            result, status = self._lookup(task, fp, upload)
+            if result is None:
+                result, status = self._call_model(task, prepared, fp, upload), 'miss'
+        if task == 'product':
+            self._record(result)
+        return result, status
+
+    def analyze_item(self, sources):
+        """Analyse a product photo and/or nutrition label for one add-item.
+
+        `sources` maps task name to `(stream, mime)`. Returns
+        `(ItemAnalysis, {task: cache_status}, mode)` where mode says how the
+        misses were sent to the model: 'combined', 'concurrent', 'single' or
+        'cached'.
+        """
+        return asyncio.run(self._analyze_item(sources))
+
+    async def _analyze_item(self, sources):
+        tasks = [task for task in TASKS if task in sources]
+        results, statuses, uploads = {}, {}, {}
+        for task in tasks:
+            uploads[task], result, status = self._lookup_upload(task, sources[task][0])
+            if result is not None:
+                results[task], statuses[task] = result, status
+
+        unseen = [task for task in tasks if task not in results]
+        # Pillow releases the GIL while decoding and resampling
+        prepared = dict(zip(unseen, await asyncio.gather(
+            *(asyncio.to_thread(self.prepare, task, *sources[task]) for task in unseen)
+        )))
+        prints = {task: fingerprint(prepared[task].image) for task in unseen}
+        for task in unseen:
+            result, status = self._lookup(task, prints[task], uploads[task])
+            if result is not None:
+                results[task], statuses[task] = result, status
+        pending = [task for task in tasks if task not in results]
+
+        if len(pending) == 2 and self.settings.combined_analysis:
+            product, nutrition = prepared['product'], prepared['nutrition']
+            item = await asyncio.to_thread(
+                self.client.analyze_item,
+                (product.data_url, product.detail),
+                (nutrition.data_url, nutrition.detail),
+            )
+            results = {'product': item.product(), 'nutrition': item.nutrition()}
+            mode = 'combined'
+        else:
+            calls = await asyncio.gather(
+                *(asyncio.to_thread(self.client.analyze, task, prepared[task].data_url, prepared[task].detail)
+                  for task in pending)
+            )
+            results.update(zip(pending, calls))
+            mode = {0: 'cached', 1: 'single'}.get(len(pending), 'concurrent')
+
+        for task in pending:
+            self._store(task, prints[task], results[task], uploads[task])
+            statuses[task] = 'miss'
+        item = ItemAnalysis.model_validate({**results.get('product', {}), **results.get('nutrition', {})})
+        self._record(item.model_dump())
+        return item, {task: statuses[task] for task in tasks}, mode
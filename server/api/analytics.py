@@ -0,0 +1,37 @@
+from flask import Blueprint, current_app, jsonify, request
+
+from .. import aggregates
+from ..errors import APIError
+
+bp = Blueprint('analytics', __name__, url_prefix='/analytics')
+
+
+def _db():
+    return current_app.extensions['lists'].connection()
+
+
+def _int_arg(name, default, maximum):
+    try:
+        value = int(request.args.get(name, default))
+    except ValueError as error:
+        raise APIError(f"'{name}' must be a number") from error
+    return max(1, min(value, maximum))
+
+
+@bp.get('/weekly')
+def weekly():
+    """Spend and nutrient totals per purchase week, oldest first."""
+    return jsonify(aggregates.weekly(_db(), _int_arg('weeks', 12, 520)))
+
+
+@bp.get('/categories')
+def categories():
+    return jsonify(aggregates.categories(_db()))
+
+
+@bp.get('/top-items')
+def top_items():
+    by = request.args.get('by', 'spend')
+    if by not in aggregates.TOP_ITEM_ORDER:
+        raise APIError(f"'by' must be one of {', '.join(aggregates.TOP_ITEM_ORDER)}")
+    return jsonify(aggregates.top_items(_db(), _int_arg('limit', 10, 100), by))
@@ -0,0 +1,75 @@
+import io
+
+from flask import Blueprint, current_app, jsonify, request
+
+from ..errors import APIError
+from ..images import decode_data_url
+from ..instrumentation import stage
+
+bp = Blueprint('analyze', __name__, url_prefix='/analyze')
+
+
+def read_image(field='image', required=True):
+    """Return `(stream, mime)` from a multipart upload or a JSON data URL."""
+    with stage('decode'):
+        return _read_image(field, required)
+
+
+def _read_image(field, required):
+    upload = request.files.get(field)
+    if upload is not None:
+        # Hand the spooled upload straight to Pillow rather than reading it
+        return upload.stream, upload.mimetype or 'image/jpeg'
+    body = request.get_json(silent=True) or {}
+    if not body.get(field):
+        if required:
+            raise APIError(f"Missing '{field}' image")
+        return None
+    data_url = body[field]
+    raw = decode_data_url(data_url)
+    mime = data_url.split(';', 1)[0][5:] if data_url.startswith('data:') else ''
+    return io.BytesIO(raw), mime or 'image/jpeg'
+
+
+def _analyze(task):
+    service = current_app.extensions['analysis']
+    result, status = service.analyze(task, *read_image())
+    response = jsonify(result)
+    response.headers['X-Cache'] = status
+    return response
+
+
+@bp.post('/product')
+def analyze_product():
+    return _analyze('product')
+
+
+@bp.post('/nutrition')
+def analyze_nutrition():
+    return _analyze('nutrition')
+
+
+@bp.post('/item')
+def analyze_item():
+    sources = {task: read_image(task, required=False) for task in ('product', 'nutrition')}
+    sources = {task: source for task, source in sources.items() if source is not None}
+    if not sources:
+        raise APIError("Send a 'product' photo, a 'nutrition' label, or both")
+
+    item, statuses, mode = current_app.extensions['analysis'].analyze_item(sources)
+    response = jsonify(item.model_dump())
+    response.headers['X-Cache'] = ', '.join(f'{task}={status}' for task, status in statuses.items())
+    response.headers['X-Analysis-Mode'] = mode
+    return response
+
+
+@bp.get('/cache')
+def cache_stats():
+    cache = current_app.extensions['analysis'].cache
+    return jsonify({'entries': len(cache), **cache.stats.as_dict()})
+
+
+@bp.get('/parsing')
+def parsing_stats():
+    """How often model replies needed repairing, and the tokens that saved."""
+    return jsonify(current_app.extensions['parser'].stats.as_dict())
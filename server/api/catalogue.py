@@ -0,0 +1,43 @@
+from flask import Blueprint, current_app, jsonify, request
+from pydantic import ValidationError
+
+from ..catalogue import normalise_barcode
+from ..errors import APIError
+from ..schemas import CatalogueFields
+
+bp = Blueprint('catalogue', __name__, url_prefix='/catalogue')
+
+MAX_RESULTS = 50
+
+
+def _catalogue():
+    return current_app.extensions['catalogue']
+
+
+@bp.get('/search')
+def search():
+    """Typo-tolerant prefix search over product names, best matches first."""
+    try:
+        limit = max(1, min(int(request.args.get('limit', 8)), MAX_RESULTS))
+    except ValueError as error:
+        raise APIError("'limit' must be a number") from error
+    return jsonify(_catalogue().search(request.args.get('q', ''), limit))
+
+
+@bp.get('/barcode/<code>')
+def barcode(code):
+    return jsonify(_catalogue().barcode(code))
+
+
+@bp.post('')
+def add_product():
+    try:
+        fields = CatalogueFields.model_validate(request.get_json(silent=True) or {}).model_dump()
+    except ValidationError as error:
+        raise APIError(f'Invalid product: {error}') from error
+    if fields['barcode'] and normalise_barcode(fields['barcode']) is None:
+        raise APIError(f"'{fields['barcode']}' is not a valid UPC or EAN barcode")
+    product = _catalogue().record(fields)
+    if product is None:
+        raise APIError('Product name is required')
+    return jsonify(product.as_dict()), 201
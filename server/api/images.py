@@ -0,0 +1,42 @@
+from flask import Blueprint, current_app, jsonify, request, send_file
+
+from ..errors import APIError
+from ..images import sniff_mime
+
+bp = Blueprint('images', __name__, url_prefix='/images')
+
+ONE_YEAR = 31536000
+
+
+@bp.post('')
+def upload_image():
+    upload = request.files.get('image')
+    if upload is None:
+        raise APIError("Missing 'image' file")
+    return jsonify({'hash': current_app.extensions['blobs'].put(upload.read())}), 201
+
+
+@bp.get('/<digest>')
+def get_image(digest):
+    """Serve a stored image, or a thumbnail of it with `?size=card|viewer`.
+
+    URLs are keyed by content hash, so responses are marked immutable and carry
+    a strong ETag. Full-size originals also honour Range requests.
+    """
+    size = request.args.get('size')
+    if size:
+        path = current_app.extensions['thumbnails'].get(digest, size)
+        etag = f'{digest}-{size}'
+    else:
+        path = current_app.extensions['blobs'].path(digest)
+        if not path.exists():
+            raise APIError('Image not found', 404)
+        etag = digest
+
+    with open(path, 'rb') as handle:
+        mime = sniff_mime(handle.read(12))
+    # conditional=True gives us If-None-Match -> 304 and Range -> 206
+    response = send_file(path, mimetype=mime, etag=etag, conditional=True, max_age=ONE_YEAR)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
@@ -0,0 +1,69 @@
+import json
+import time
+
+from flask import Blueprint, Response, current_app, request, stream_with_context
+
+from ..errors import APIError
+from ..ingest import BatchIngester, group_sources, upload_sources, zip_sources
+from ..instrumentation import current_trace
+
+bp = Blueprint('ingest', __name__, url_prefix='/ingest')
+
+
+def _format(row, sse):
+    body = json.dumps(row)
+    return f'data: {body}\n\n' if sse else body + '\n'
+
+
+@bp.post('/batch')
+def ingest_batch():
+    """Analyse a whole cart of photos, streaming one row per item as it completes.
+
+    Send photos as repeated `files` fields and/or a zip as `archive`. A label
+    is paired with its product by name: `milk.jpg` + `milk-label.jpg`, or a
+    `milk/` folder holding `product.jpg` and `label.jpg`.
+    """
+    settings = current_app.config['SETTINGS']
+    sources = upload_sources(request.files.getlist('files'))
+    archive = request.files.get('archive')
+    if archive is not None:
+        sources += zip_sources(archive.stream, settings.batch_max_bytes)
+
+    items = group_sources(sources)
+    if not items:
+        raise APIError('No images found in the upload')
+    if len(items) > settings.batch_max_items:
+        raise APIError(f'At most {settings.batch_max_items} items per batch', 413)
+
+    sse = 'text/event-stream' in request.headers.get('Accept', '')
+    ingester = BatchIngester(current_app.extensions['analysis'], settings.batch_workers)
+
+    def generate():
+        started = time.perf_counter()
+        failed = 0
+        for row in ingester.stream(items):
+            failed += row['status'] != 'ok'
+            yield _format(row, sse)
+        elapsed = time.perf_counter() - started
+        summary = {
+            'done': True,
+            'items': len(items),
+            'failed': failed,
+            'elapsed_ms': round(elapsed * 1000, 1),
+            'items_per_sec': round(len(items) / elapsed, 2) if elapsed else None,
+        }
+        # Headers went out before any item was analysed, so the stage
+        # breakdown travels in this row rather than in Server-Timing
+        trace = current_trace()
+        if trace is not None:
+            summary['trace'] = trace.as_dict()
+        yield _format(summary, sse)
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream' if sse else 'application/x-ndjson',
+    )
+    # Stop proxies from holding rows back until the batch is done
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,114 @@
+import json
+
+from flask import Blueprint, current_app, jsonify, request
+from pydantic import ValidationError
+
+from ..errors import APIError
+from ..images import decode_data_url
+from ..schemas import ItemFields
+
+bp = Blueprint('lists', __name__, url_prefix='/lists')
+
+# Image fields as the React app names them -> blob reference fields
+IMAGE_FIELDS = {'productPhoto': 'productImage', 'nutritionLabel': 'labelImage'}
+
+
+def _store():
+    return current_app.extensions['lists']
+
+
+def _list_name():
+    name = ((request.get_json(silent=True) or {}).get('name') or '').strip()
+    if not name:
+        raise APIError('List name is required')
+    return name
+
+
+def _item_fields():
+    """Validate an item from JSON, or from multipart with an `item` JSON field.
+
+    Photos may come as uploaded files, as the data URLs older saved lists
+    hold, or as hashes of blobs already on the server. Each is stored once
+    and the item keeps only its hash.
+    """
+    if request.files or request.form:
+        try:
+            body = json.loads(request.form.get('item') or '{}')
+        except json.JSONDecodeError as error:
+            raise APIError(f"The 'item' field is not valid JSON: {error}") from error
+    else:
+        body = request.get_json(silent=True) or {}
+    if not isinstance(body, dict):
+        raise APIError('An item must be a JSON object')
+
+    blobs = current_app.extensions['blobs']
+    for field, ref in IMAGE_FIELDS.items():
+        upload = request.files.get(field)
+        value = body.pop(field, None)
+        if upload is not None:
+            body[ref] = blobs.put(upload.read())
+        elif isinstance(value, str) and value.startswith('data:'):
+            body[ref] = blobs.put(decode_data_url(value))
+        elif body.get(ref) is not None and not (isinstance(body[ref], str) and blobs.exists(body[ref])):
+            raise APIError(f'Unknown image {body[ref]}')
+
+    try:
+        return ItemFields.model_validate(body).model_dump(exclude_unset=True)
+    except ValidationError as error:
+        raise APIError(f'Invalid item: {error}') from error
+
+
+@bp.get('')
+def list_lists():
+    """Every saved list, or with `?name=` only the list of that name (if any)."""
+    store = _store()
+    name = request.args.get('name')
+    if name is None:
+        return jsonify(store.summaries())
+    list_id = store.find(name)
+    return jsonify([] if list_id is None else store.summaries(list_id))
+
+
+@bp.post('')
+def create_list():
+    store = _store()
+    list_id = store.create_list(_list_name())
+    return jsonify(store.get_list(list_id)), 201
+
+
+@bp.get('/<int:list_id>')
+def get_list(list_id):
+    return jsonify(_store().get_list(list_id))
+
+
+@bp.get('/<int:list_id>/totals')
+def list_totals(list_id):
+    return jsonify(_store().totals(list_id))
+
+
+@bp.patch('/<int:list_id>')
+def rename_list(list_id):
+    _store().rename_list(list_id, _list_name())
+    return jsonify(_store().get_list(list_id))
+
+
+@bp.delete('/<int:list_id>')
+def delete_list(list_id):
+    _store().delete_list(list_id)
+    return '', 204
+
+
+@bp.post('/<int:list_id>/items')
+def add_item(list_id):
+    return jsonify(_store().add_item(list_id, _item_fields())), 201
+
+
+@bp.patch('/<int:list_id>/items/<int:item_id>')
+def update_item(list_id, item_id):
+    return jsonify(_store().update_item(list_id, item_id, _item_fields()))
+
+
+@bp.delete('/<int:list_id>/items/<int:item_id>')
+def delete_item(list_id, item_id):
+    _store().delete_item(list_id, item_id)
+    return '', 204
@@ -0,0 +1,61 @@
+from flask import Flask, jsonify
+
+from .analysis import AnalysisService
+from .api import analytics, analyze, catalogue, images, ingest, lists
+from .cache import ResultCache
+from .catalogue import Catalogue
+from .config import Settings
+from .errors import register_error_handlers
+from .instrumentation import register_instrumentation
+from .parsing import ResponseParser
+from .ratelimit import RateLimiter, bucket_for
+from .storage import BlobStore, ListStore
+from .thumbnails import ThumbnailCache
+from .vision import VisionClient
+
+
+def create_app(settings=None, client=None):
+    """Build the API app. `client` lets tests and benchmarks swap out the model."""
+    settings = settings or Settings.from_env()
+    app = Flask(__name__)
+    app.config['SETTINGS'] = settings
+
+    cache = ResultCache(settings.cache_path, settings.cache_max_entries, settings.cache_disk_entries)
+    bucket = None
+    if settings.model_rate_per_sec > 0:
+        bucket = bucket_for(settings.openai_api_key, settings.model_rate_per_sec, settings.model_burst)
+    app.extensions['parser'] = ResponseParser()
+    limiter = RateLimiter(bucket, settings.model_max_retries)
+    client = client or VisionClient(settings, app.extensions['parser'], limiter)
+    app.extensions['catalogue'] = Catalogue(settings.catalogue_path)
+    app.extensions['analysis'] = AnalysisService(cache, client, settings, app.extensions['catalogue'])
+    app.extensions['lists'] = ListStore(settings.lists_path)
+    app.extensions['blobs'] = BlobStore(settings.blob_dir)
+    app.extensions['thumbnails'] = ThumbnailCache(
+        app.extensions['blobs'], settings.thumbnail_dir, settings.image_format
+    )
+
+    app.register_blueprint(analyze.bp)
+    app.register_blueprint(ingest.bp)
+    app.register_blueprint(lists.bp)
+    app.register_blueprint(images.bp)
+    app.register_blueprint(analytics.bp)
+    app.register_blueprint(catalogue.bp)
+    register_error_handlers(app)
+    register_instrumentation(app)
+
+    @app.after_request
+    def add_cors_headers(response):
+        # The React dev server runs on a different port
+        response.headers['Access-Control-Allow-Origin'] = settings.cors_origin
+        response.headers['Access-Control-Allow-Headers'] = 'Content-Type, X-Trace-Id, X-Profile'
+        response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, PATCH, DELETE, OPTIONS'
+        response.headers['Access-Control-Expose-Headers'] = 'X-Trace-Id, Server-Timing, X-Cache, X-Analysis-Mode'
+        response.headers['Timing-Allow-Origin'] = settings.cors_origin
+        return response
+
+    @app.get('/health')
+    def health():
+        return jsonify({'status': 'ok'})
+
+    return app
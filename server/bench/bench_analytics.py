@@ -0,0 +1,83 @@
+"""Analytics query latency from rollup tables as item history grows to 100k rows.
+
+Each checkpoint also times the equivalent GROUP BY over the items table, which
+is what answering the same questions without rollups would cost.
+
+    python -m server.bench.bench_analytics --items 100000
+"""
+import argparse
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from .. import aggregates
+from ..storage import ListStore
+
+CHECKPOINTS = (1000, 10000, 50000, 100000, 250000)
+CATEGORIES = ('Produce', 'Dairy', 'Pantry', 'Bakery', 'Meat', 'Frozen', 'Snacks', 'Drinks')
+WEEK = 7 * 24 * 3600
+
+SCAN_WEEKLY = """
+SELECT strftime('%Y-%W', purchased_at, 'unixepoch') AS week,
+       SUM(ROUND(price * 100) * quantity), SUM(calories * quantity), SUM(protein * quantity)
+FROM items GROUP BY week ORDER BY week DESC LIMIT 52
+"""
+SCAN_TOP = """
+SELECT LOWER(name) AS product, SUM(ROUND(price * 100) * quantity) AS spend
+FROM items GROUP BY product ORDER BY spend DESC LIMIT 10
+"""
+
+
+def timed(fn, repeat=20):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=100000)
+    parser.add_argument('--per-list', type=int, default=25)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    products = [(f'Product {i}', rng.choice(CATEGORIES), round(rng.uniform(0.5, 15), 2)) for i in range(500)]
+    start = time.time() - 104 * WEEK
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ListStore(Path(tmp) / 'lists.sqlite3')
+        db = store.connection()
+        print(f'{"items":>8} | {"add item":>9} {"list tot":>9} {"weekly":>8} {"category":>9} {"top 10":>8} '
+              f'| {"scan weekly":>11} {"scan top":>9}')
+        count, list_id = 0, None
+        for checkpoint in [c for c in CHECKPOINTS if c <= args.items]:
+            add_samples = []
+            while count < checkpoint:
+                if count % args.per_list == 0:
+                    list_id = store.create_list(f'Shop {count // args.per_list}')
+                    purchased = start + (count / args.items) * 104 * WEEK
+                name, category, price = rng.choice(products)
+                item = {'name': name, 'category': category, 'price': price, 'quantity': rng.randrange(1, 4),
+                        'purchasedAt': purchased,
+                        'nutritionInfo': {'calories': rng.randrange(50, 400), 'protein': rng.randrange(0, 30)}}
+                started = time.perf_counter()
+                store.add_item(list_id, item)
+                add_samples.append((time.perf_counter() - started) * 1000)
+                count += 1
+
+            print(f'{count:>8} | {statistics.median(add_samples):7.3f}ms '
+                  f'{timed(lambda: store.totals(list_id)):7.3f}ms '
+                  f'{timed(lambda: aggregates.weekly(db, 52)):6.3f}ms '
+                  f'{timed(lambda: aggregates.categories(db)):7.3f}ms '
+                  f'{timed(lambda: aggregates.top_items(db, 10)):6.3f}ms | '
+                  f'{timed(lambda: db.execute(SCAN_WEEKLY).fetchall(), 3):9.2f}ms '
+                  f'{timed(lambda: db.execute(SCAN_TOP).fetchall(), 3):7.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Hit rate and latency of the analysis cache against the local stub model.
+
+    python -m server.bench.bench_cache --products 40 --scans 400 --latency-ms 800
+"""
+import argparse
+import base64
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from ..app import create_app
+from ..config import Settings
+from ..stub_model import StubServer
+from .fixtures import make_photo, reshoot
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def data_url(raw):
+    return 'data:image/jpeg;base64,' + base64.b64encode(raw).decode('ascii')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=40)
+    parser.add_argument('--scans', type=int, default=400)
+    parser.add_argument('--latency-ms', type=float, default=800.0)
+    parser.add_argument('--reshoot-ratio', type=float, default=0.3,
+                        help='share of repeat product scans that are re-encoded rather than identical')
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    photos = [make_photo(seed) for seed in range(args.products)]
+    # Weekly staples dominate: a Zipf-ish draw over the catalogue
+    weights = [1 / (rank + 1) for rank in range(args.products)]
+
+    with StubServer(latency=args.latency_ms / 1000) as stub, tempfile.TemporaryDirectory() as tmp:
+        settings = Settings(openai_api_key='stub', openai_base_url=stub.base_url, data_dir=Path(tmp))
+        client = create_app(settings).test_client()
+        timings = {'hit': [], 'near': [], 'miss': []}
+        seen = set()
+
+        for _ in range(args.scans):
+            task = rng.choice(('product', 'nutrition'))
+            index = rng.choices(range(args.products), weights)[0]
+            raw = photos[index]
+            if task == 'product' and (task, index) in seen and rng.random() < args.reshoot_ratio:
+                raw = reshoot(raw, quality=rng.randrange(70, 90))
+            seen.add((task, index))
+
+            started = time.perf_counter()
+            response = client.post(f'/analyze/{task}', json={'image': data_url(raw)})
+            elapsed = (time.perf_counter() - started) * 1000
+            timings[response.headers['X-Cache']].append(elapsed)
+
+        stats = client.get('/analyze/cache').get_json()
+
+    print(f'scans={args.scans} unique_photos={args.products} stub_latency={args.latency_ms:.0f}ms')
+    print(f'model calls: {stub.calls}  hit rate: {stats["hit_rate"]:.1%}')
+    for status, samples in timings.items():
+        if samples:
+            print(f'  {status:<5} n={len(samples):<4} p50={statistics.median(samples):8.2f}ms '
+                  f'p95={percentile(samples, 95):8.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Catalogue search latency over a large synthetic product list.
+
+Builds the catalogue through `Catalogue.record` (SQLite + index), reopens it
+to time the startup rebuild, then times typed-prefix, multi-word, typo and
+barcode lookups. The goal is well under a millisecond per query at 100k.
+
+    python -m server.bench.bench_catalogue --products 100000
+"""
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from ..catalogue import Catalogue
+from .bench_cache import percentile
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ver', 'da', 'sun', 'bel', 'ro', 'ta', 'fen', 'gra', 'no', 'pi', 'zu', 'hal']
+
+BRANDS = ['Acme', 'Barilla', 'Heinz', 'Kellogg', 'Nestle', 'Danone', 'Tesco', 'Organic Valley', 'Kirkland',
+          'Great Value', 'Quaker', 'Kraft', 'Tillamook', 'Chobani', 'Oatly', 'Lindt', 'Warburtons', 'Hovis']
+DESCRIPTORS = ['Whole', 'Skimmed', 'Organic', 'Free Range', 'Smoked', 'Mature', 'Mild', 'Spicy', 'Unsalted',
+               'Wholemeal', 'Gluten Free', 'Low Fat', 'Extra Virgin', 'Roasted', 'Sweet', 'Classic', 'Greek']
+NOUNS = ['Milk', 'Cheddar', 'Yogurt', 'Butter', 'Bread', 'Spaghetti', 'Penne', 'Ketchup', 'Oats', 'Granola',
+         'Chicken Breast', 'Salmon Fillet', 'Olive Oil', 'Peanut Butter', 'Almonds', 'Coffee Beans', 'Green Tea',
+         'Chocolate', 'Tomato Soup', 'Baked Beans', 'Rice', 'Lentils', 'Eggs', 'Bananas', 'Apples', 'Spinach']
+SIZES = ['250g', '500g', '1kg', '1L', '2L', '4 pack', '6 pack', '12 pack', '400ml', '750ml']
+
+QUERIES = {
+    'one letter': ['m', 'c', 'b', 's', 'o'],
+    'prefix': ['chedd', 'spag', 'granol', 'almon', 'lentil'],
+    'two words': ['whole milk', 'barilla pen', 'smoked salm', 'greek yog', 'organic egg'],
+    'typo': ['chedar', 'spagheti', 'granloa', 'yoghurt', 'whle milk'],
+    'no match': ['zzzz', 'qwerty'],
+}
+
+
+def brand(rng):
+    # A few big brands plus a long tail of small ones, as in a real shop
+    if rng.random() < 0.3:
+        return rng.choice(BRANDS)
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randrange(2, 4))).title()
+
+
+def gtin(rng):
+    body = f'{rng.randrange(10 ** 11):011d}0'
+    total = sum(int(digit) * (3 if i % 2 == 0 else 1) for i, digit in enumerate(reversed(body)))
+    return body + str((10 - total % 10) % 10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(5)
+    barcodes = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'catalogue.sqlite3'
+        catalogue = Catalogue(path)
+        started = time.perf_counter()
+        while len(catalogue) < args.products:
+            name = f'{brand(rng)} {rng.choice(DESCRIPTORS)} {rng.choice(NOUNS)} {rng.choice(SIZES)}'
+            product = catalogue.record({'name': name, 'barcode': gtin(rng), 'calories': rng.randrange(20, 600)})
+            # Repeat sightings of a name move it to the newest barcode
+            barcodes[product.id] = product.barcode
+        print(f'recorded {len(catalogue)} products in {time.perf_counter() - started:.1f}s')
+        catalogue.close()
+
+        started = time.perf_counter()
+        catalogue = Catalogue(path)
+        vocabulary = len(catalogue.index._vocabulary)
+        print(f'reloaded index in {time.perf_counter() - started:.2f}s ({vocabulary} distinct words)\n')
+
+        print(f'{"query":<12} {"p50":>9} {"p99":>9}  example')
+        for kind, queries in QUERIES.items():
+            samples = []
+            for _ in range(args.repeat):
+                for query in queries:
+                    started = time.perf_counter()
+                    results = catalogue.search(query)
+                    samples.append((time.perf_counter() - started) * 1e6)
+            example = results[0]['name'] if results else '-'
+            print(f'{kind:<12} {percentile(samples, 50):7.0f}us {percentile(samples, 99):7.0f}us  '
+                  f'{queries[-1]!r} -> {example}')
+
+        samples = []
+        for barcode in rng.sample(sorted(barcodes.values()), min(len(barcodes), args.repeat * 5)):
+            started = time.perf_counter()
+            catalogue.barcode(barcode)
+            samples.append((time.perf_counter() - started) * 1e6)
+        print(f'{"barcode":<12} {percentile(samples, 50):7.0f}us {percentile(samples, 99):7.0f}us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Batch ingestion throughput against a stub model with injected latency and 429s.
+
+    python -m server.bench.bench_ingest --items 40 --latency-ms 800 --error-rate 0.1
+"""
+import argparse
+import io
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from ..app import create_app
+from ..config import Settings
+from ..stub_model import StubServer
+from .fixtures import make_photo
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=40)
+    parser.add_argument('--latency-ms', type=float, default=800.0)
+    parser.add_argument('--error-rate', type=float, default=0.1)
+    parser.add_argument('--rate', type=float, default=20.0, help='client-side model requests/sec')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8, 16])
+    args = parser.parse_args()
+
+    photos = {}
+    for i in range(args.items):
+        photos[f'item{i:03}.jpg'] = make_photo(2 * i, size=(1600, 1200))
+        photos[f'item{i:03}-label.jpg'] = make_photo(2 * i + 1, size=(1600, 1200))
+
+    print(f'{args.items} items, stub latency {args.latency_ms:.0f}ms, '
+          f'{args.error_rate:.0%} injected 429s, limit {args.rate:.0f} req/s')
+    with StubServer(latency=args.latency_ms / 1000, error_rate=args.error_rate) as stub, \
+            tempfile.TemporaryDirectory() as tmp:
+        for workers in args.workers:
+            settings = Settings(
+                openai_api_key=f'stub-{workers}', openai_base_url=stub.base_url,
+                data_dir=Path(tmp) / str(workers), batch_workers=workers,
+                model_rate_per_sec=args.rate, model_burst=max(1, int(args.rate)),
+            )
+            app = create_app(settings)
+            files = [(io.BytesIO(raw), name) for name, raw in photos.items()]
+            limited_before = stub.rate_limited
+
+            started = time.perf_counter()
+            response = app.test_client().post('/ingest/batch', data={'files': files})
+            first_row = None
+            for chunk in response.response:
+                if first_row is None:
+                    first_row = time.perf_counter() - started
+                summary = chunk
+            elapsed = time.perf_counter() - started
+            summary = json.loads(summary)
+
+            print(f'  workers={workers:<3} {args.items / elapsed:6.2f} items/s  '
+                  f'first row {first_row * 1000:7.0f}ms  total {elapsed:6.2f}s  '
+                  f'failed={summary["failed"]} 429s={stub.rate_limited - limited_before}')
+
+
+if __name__ == '__main__':
+    main()
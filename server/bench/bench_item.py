@@ -0,0 +1,66 @@
+"""Add-item latency for serial, concurrent and combined analysis against the stub model.
+
+    python -m server.bench.bench_item --items 30 --latency-ms 800
+"""
+import argparse
+import dataclasses
+import io
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from ..app import create_app
+from ..config import Settings
+from ..stub_model import StubServer
+from .bench_cache import percentile
+from .fixtures import make_photo
+
+
+def upload(raw, name):
+    return io.BytesIO(raw), name
+
+
+def run_serial(client, product, label):
+    # What handleAddItem does today: product analysis, then the label
+    client.post('/analyze/product', data={'image': upload(product, 'p.jpg')})
+    client.post('/analyze/nutrition', data={'image': upload(label, 'l.jpg')})
+
+
+def run_item(client, product, label):
+    client.post('/analyze/item', data={'product': upload(product, 'p.jpg'), 'nutrition': upload(label, 'l.jpg')})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=30)
+    parser.add_argument('--latency-ms', type=float, default=800.0)
+    args = parser.parse_args()
+
+    pairs = [(make_photo(2 * i, size=(2016, 1512)), make_photo(2 * i + 1, size=(2016, 1512)))
+             for i in range(args.items)]
+
+    with StubServer(latency=args.latency_ms / 1000) as stub, tempfile.TemporaryDirectory() as tmp:
+        base = Settings(openai_api_key='stub', openai_base_url=stub.base_url)
+        modes = {
+            'serial': (dataclasses.replace(base, combined_analysis=False), run_serial),
+            'concurrent': (dataclasses.replace(base, combined_analysis=False), run_item),
+            'combined': (base, run_item),
+        }
+        print(f'{args.items} items, stub latency {args.latency_ms:.0f}ms per model call')
+        for name, (settings, run) in modes.items():
+            # Fresh cache per mode so every add is a miss
+            settings = dataclasses.replace(settings, data_dir=Path(tmp) / name)
+            client = create_app(settings).test_client()
+            calls_before = stub.calls
+            timings = []
+            for product, label in pairs:
+                started = time.perf_counter()
+                run(client, product, label)
+                timings.append((time.perf_counter() - started) * 1000)
+            print(f'  {name:<10} p50={statistics.median(timings):8.1f}ms p95={percentile(timings, 95):8.1f}ms '
+                  f'model calls={stub.calls - calls_before}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Reply parsing on a corpus of model replies: repair in place vs re-sending the image.
+
+Each reply in replies.jsonl is parsed the old way (strip fences, json.loads,
+validate; any failure means re-running the whole image request) and through
+`ResponseParser`, whose text-only repair calls go to the stub model.
+
+    python -m server.bench.bench_parsing
+"""
+import argparse
+import json
+import re
+import statistics
+import time
+from pathlib import Path
+
+from pydantic import ValidationError
+
+from ..config import Settings
+from ..parsing import ResponseParser, parse_locally
+from ..schemas import NUTRIENTS, ItemAnalysis, NutritionInfo, ProductInfo
+from ..stub_model import StubServer
+from ..vision import VisionClient
+
+CORPUS = Path(__file__).with_name('replies.jsonl')
+SCHEMAS = {'product': ProductInfo, 'nutrition': NutritionInfo, 'item': ItemAnalysis}
+OLD_FENCE_RE = re.compile(r'```json\n?|\n?```')
+OLD_NUMBER_RE = re.compile(r'-?\d+(?:\.\d+)?')
+
+
+def legacy_parse(content, schema):
+    """The previous path: fences off, json.loads, and units cut off numbers."""
+    try:
+        data = json.loads(OLD_FENCE_RE.sub('', content))
+        schema.model_validate(data)
+    except (json.JSONDecodeError, ValidationError):
+        return None
+    values = {'name': data.get('name')}
+    for nutrient in NUTRIENTS:
+        value = data.get(nutrient)
+        if isinstance(value, str):
+            match = OLD_NUMBER_RE.search(value.replace(',', ''))
+            value = float(match.group()) if match else None
+        values[nutrient] = value
+    return values
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1e6)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--corpus', type=Path, default=CORPUS)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+    replies = [json.loads(line) for line in args.corpus.read_text().splitlines() if line.strip()]
+
+    legacy_failed = resend_tokens = 0
+    legacy_us, local_us = [], []
+    for reply in replies:
+        schema = SCHEMAS[reply['task']]
+        if legacy_parse(reply['content'], schema) is None:
+            legacy_failed += 1
+            resend_tokens += reply['request_tokens']
+        legacy_us.append(timed(lambda: legacy_parse(reply['content'], schema), args.repeat))
+        local_us.append(timed(lambda: parse_locally(reply['content'], schema), args.repeat))
+
+    with StubServer() as stub:
+        vision = VisionClient(Settings(openai_api_key='stub', openai_base_url=stub.base_url), ResponseParser())
+        for reply in replies:
+            vision.parser.parse(reply['content'], SCHEMAS[reply['task']], repair=vision.repair,
+                                request_tokens=reply['request_tokens'])
+    stats = vision.parser.stats
+
+    # Replies the legacy path accepted but read wrongly: unit suffixes cut off
+    # ("500mg" as 500 g), or fields under other keys silently lost
+    misread = 0
+    for reply in replies:
+        schema = SCHEMAS[reply['task']]
+        old, (new, _) = legacy_parse(reply['content'], schema), parse_locally(reply['content'], schema)
+        if old is not None:
+            misread += any(old[field] != getattr(new, field, None) for field in old if field in schema.model_fields)
+
+    counts = ', '.join(f'{task}={sum(reply["task"] == task for reply in replies)}' for task in SCHEMAS)
+    print(f'{len(replies)} replies ({counts})\n')
+    print(f'{"":<22} {"legacy":>10} {"repairing":>10}')
+    print(f'{"unusable replies":<22} {legacy_failed:>10} {stats.failed:>10}')
+    print(f'{"failure rate":<22} {legacy_failed / len(replies):>10.1%} {stats.failed / len(replies):>10.1%}')
+    print(f'{"re-request tokens":<22} {resend_tokens:>10} {stats.repair_tokens:>10}')
+    print(f'{"parse p50 per reply":<22} {statistics.median(legacy_us):>8.1f}us {statistics.median(local_us):>8.1f}us\n')
+    print(f'clean {stats.clean}, repaired locally {stats.repaired_locally}, repaired by text-only call '
+          f'{stats.repaired_by_model}, failed {stats.failed}')
+    print(f'parse-failure rate {stats.failure_rate:.1%}; tokens saved {stats.tokens_saved} '
+          f'({stats.tokens_saved / max(resend_tokens, 1):.0%} of the re-request cost)')
+    print(f'{misread} replies the legacy path accepted had values lost or in the wrong unit')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Payload size, encode time and end-to-end latency with and without preprocessing.
+
+    python -m server.bench.bench_preprocess --images 12 --latency-ms 300
+"""
+import argparse
+import io
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from ..app import create_app
+from ..config import Settings
+from ..preprocess import PROFILES, prepare
+from ..stub_model import StubServer
+from .bench_cache import percentile
+from .fixtures import make_photo
+
+
+def encode_stats(photos, task):
+    sizes, timings = [], []
+    for raw in photos:
+        started = time.perf_counter()
+        prepared = prepare(io.BytesIO(raw), PROFILES[task])
+        timings.append((time.perf_counter() - started) * 1000)
+        sizes.append(len(prepared.data))
+    return sizes, timings
+
+
+def end_to_end(photos, task, stub, preprocess):
+    with tempfile.TemporaryDirectory() as tmp:
+        settings = Settings(openai_api_key='stub', openai_base_url=stub.base_url,
+                            data_dir=Path(tmp), preprocess=preprocess)
+        client = create_app(settings).test_client()
+        timings = []
+        for index, raw in enumerate(photos):
+            started = time.perf_counter()
+            response = client.post(f'/analyze/{task}', data={'image': (io.BytesIO(raw), f'{index}.jpg')})
+            timings.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, response.get_json()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--images', type=int, default=12)
+    parser.add_argument('--latency-ms', type=float, default=300.0)
+    args = parser.parse_args()
+
+    # Typical 12 MP phone camera output
+    photos = [make_photo(seed, size=(4032, 3024), quality=92, noise=40) for seed in range(args.images)]
+    source = [len(raw) for raw in photos]
+    print(f'{args.images} fixture photos, 4032x3024, mean {statistics.mean(source) / 1e6:.2f} MB')
+
+    with StubServer(latency=args.latency_ms / 1000) as stub:
+        for task in ('product', 'nutrition'):
+            sizes, encode_ms = encode_stats(photos, task)
+            before = end_to_end(photos, task, stub, preprocess=False)
+            after = end_to_end(photos, task, stub, preprocess=True)
+            print(f'\n{task} (max side {PROFILES[task].max_side}px, detail={PROFILES[task].detail})')
+            print(f'  bytes     {statistics.mean(source) / 1e3:10.1f} KB -> {statistics.mean(sizes) / 1e3:8.1f} KB '
+                  f'({statistics.mean(source) / statistics.mean(sizes):.0f}x smaller)')
+            print(f'  prepare   p50={statistics.median(encode_ms):7.1f}ms p95={percentile(encode_ms, 95):7.1f}ms')
+            print(f'  latency   before p50={statistics.median(before):7.1f}ms p95={percentile(before, 95):7.1f}ms')
+            print(f'            after  p50={statistics.median(after):7.1f}ms p95={percentile(after, 95):7.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
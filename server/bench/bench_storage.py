@@ -0,0 +1,115 @@
+"""Save/load latency of the SQLite list store as the number of saved lists grows.
+
+`find` is the by-name lookup a save starts with (GET /lists?name=) and
+`index` the full list of summaries (GET /lists), read from the running
+totals rather than by counting items.
+
+Compares against the old approach of one JSON document holding every list
+(what `handleSaveList` does with localStorage), re-parsed and re-serialised
+on each save or load.
+
+    python -m server.bench.bench_storage --lists 5000 --items 20
+"""
+import argparse
+import base64
+import json
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from ..storage import BlobStore, ListStore
+from .bench_cache import percentile
+from .fixtures import make_photo
+
+CHECKPOINTS = (10, 100, 250, 1000, 2500, 5000, 10000)
+
+
+def timed(fn, repeat=5):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), percentile(samples, 95)
+
+
+def make_items(rng, images, count):
+    return [{
+        'name': f'Item {rng.randrange(1000)}',
+        'description': 'Something from the shelf',
+        'price': round(rng.uniform(0.5, 20), 2),
+        'quantity': rng.randrange(1, 5),
+        'nutritionInfo': {'servingSize': '40g', 'calories': 150.0, 'protein': 5.0,
+                          'carbohydrates': 27.0, 'fat': 3.0, 'sugar': 1.0},
+        'photo': rng.choice(images),
+    } for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lists', type=int, default=5000)
+    parser.add_argument('--items', type=int, default=20)
+    parser.add_argument('--blob-json-limit', type=int, default=250,
+                        help='stop timing the single-JSON baseline past this many lists')
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    images = [make_photo(seed, size=(160, 120), quality=60) for seed in range(50)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ListStore(Path(tmp) / 'lists.sqlite3')
+        blobs = BlobStore(Path(tmp) / 'blobs')
+        document = {}
+
+        def save_sqlite(name):
+            list_id = store.create_list(name)
+            for item in make_items(rng, images, args.items):
+                photo = item.pop('photo')
+                store.add_item(list_id, {**item, 'productImage': blobs.put(photo)})
+            return list_id
+
+        def save_json(name):
+            lists = json.loads(document.get('groceryLists', '{}'))
+            lists[name] = [{**item, 'photo': base64.b64encode(item['photo']).decode('ascii')}
+                           for item in make_items(rng, images, args.items)]
+            document['groceryLists'] = json.dumps(lists)
+
+        def load_json(name):
+            return json.loads(document['groceryLists'])[name]
+
+        print(f'{args.items} items per list, {len(images)} distinct images '
+              f'({statistics.mean(map(len, images)) / 1e3:.1f} KB each)')
+        print(f'{"lists":>7} | {"sqlite save":>12} {"load":>8} {"update":>8} {"find":>8} {"index":>8} | '
+              f'{"json save":>10} {"load":>8} {"doc MB":>7}')
+        count = 0
+        ids = []
+        for checkpoint in [c for c in CHECKPOINTS if c <= args.lists]:
+            while count < checkpoint:
+                ids.append(save_sqlite(f'list {count}'))
+                if count < args.blob_json_limit:
+                    save_json(f'list {count}')
+                count += 1
+
+            probe = count
+            save_ms, _ = timed(lambda: ids.append(save_sqlite(f'probe {probe} {len(ids)}')))
+            load_ms, _ = timed(lambda: store.get_list(rng.choice(ids)))
+            target = store.get_list(rng.choice(ids))
+            update_ms, _ = timed(lambda: store.update_item(target['id'], target['items'][0]['id'], {'quantity': 2}))
+            find_ms, _ = timed(lambda: store.summaries(store.find(target['name'])))
+            index_ms, _ = timed(store.summaries)
+            row = (f'{count:>7} | {save_ms:10.2f}ms {load_ms:6.2f}ms {update_ms:6.2f}ms '
+                   f'{find_ms:6.2f}ms {index_ms:6.2f}ms |')
+            if count <= args.blob_json_limit:
+                json_save, _ = timed(lambda: save_json(f'probe {probe} {rng.random()}'))
+                json_load, _ = timed(lambda: load_json(f'list {rng.randrange(count)}'))
+                size = len(document['groceryLists']) / 1e6
+                row += f' {json_save:8.2f}ms {json_load:6.2f}ms {size:7.1f}'
+            else:
+                row += f' {"-":>10} {"-":>8} {"-":>7}'
+            print(row)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Bytes, decoded bitmap memory and serve latency for a list's card images.
+
+Compares inlining each original as base64 (what a localStorage-loaded list
+puts in the DOM) with serving 'card' thumbnails from the image tier.
+
+    python -m server.bench.bench_thumbnails --items 60
+"""
+import argparse
+import io
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from PIL import Image
+
+from ..app import create_app
+from ..config import Settings
+from .bench_cache import percentile
+from .fixtures import make_photo
+
+
+def bitmap_bytes(raw):
+    width, height = Image.open(io.BytesIO(raw)).size
+    return width * height * 4
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=60)
+    parser.add_argument('--distinct', type=int, default=12, help='distinct photos among the items')
+    args = parser.parse_args()
+
+    photos = [make_photo(seed, size=(4032, 3024), quality=90, noise=40) for seed in range(args.distinct)]
+    items = [photos[i % args.distinct] for i in range(args.items)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        client = create_app(Settings(openai_api_key='unused', data_dir=Path(tmp))).test_client()
+        digests = [client.post('/images', data={'image': (io.BytesIO(raw), 'p.jpg')}).get_json()['hash']
+                   for raw in items]
+
+        cold, warm, revalidate, thumbs = [], [], [], {}
+        for digest in digests:
+            started = time.perf_counter()
+            response = client.get(f'/images/{digest}?size=card')
+            elapsed = (time.perf_counter() - started) * 1000
+            (cold if digest not in thumbs else warm).append(elapsed)
+            thumbs[digest] = response.data
+        for digest in digests:
+            etag = f'"{digest}-card"'
+            started = time.perf_counter()
+            client.get(f'/images/{digest}?size=card', headers={'If-None-Match': etag})
+            revalidate.append((time.perf_counter() - started) * 1000)
+
+    inline = sum(len(raw) * 4 / 3 for raw in items)
+    inline_bitmaps = sum(bitmap_bytes(raw) for raw in items)
+    card_bytes = sum(len(thumbs[digest]) for digest in digests)
+    card_bitmaps = sum(bitmap_bytes(thumbs[digest]) for digest in digests)
+
+    print(f'{args.items} cards, {args.distinct} distinct 4032x3024 photos')
+    print(f'  inline base64   {inline / 1e6:8.1f} MB in DOM   {inline_bitmaps / 1e6:8.1f} MB decoded')
+    print(f'  card thumbnails {card_bytes / 1e6:8.2f} MB fetched  {card_bitmaps / 1e6:8.1f} MB decoded '
+          f'({inline / card_bytes:.0f}x / {inline_bitmaps / card_bitmaps:.0f}x smaller)')
+    print(f'  render  p50={statistics.median(cold):7.1f}ms p95={percentile(cold, 95):7.1f}ms (first request)')
+    if warm:
+        print(f'  serve   p50={statistics.median(warm):7.2f}ms p95={percentile(warm, 95):7.2f}ms (on disk)')
+    print(f'  304     p50={statistics.median(revalidate):7.2f}ms p95={percentile(revalidate, 95):7.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
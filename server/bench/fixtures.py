@@ -0,0 +1,33 @@
+"""Synthetic product and label photos so the benchmarks need no checked-in images."""
+import io
+import random
+
+from PIL import Image, ImageDraw
+
+
+def make_photo(seed, size=(1600, 1200), fmt='JPEG', quality=90, noise=0):
+    rng = random.Random(seed)
+    image = Image.new('RGB', size, tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(24):
+        x0, y0 = rng.randrange(size[0]), rng.randrange(size[1])
+        x1, y1 = x0 + rng.randrange(50, 600), y0 + rng.randrange(50, 400)
+        draw.rectangle((x0, y0, x1, y1), fill=tuple(rng.randrange(256) for _ in range(3)))
+    for row in range(12):
+        draw.text((60, 60 + row * 40), f'Nutrient {row}  {rng.randrange(500)}g', fill=(0, 0, 0))
+    if noise:
+        # Sensor grain; without it JPEGs compress far better than real photos
+        grain = Image.effect_noise(size, noise).convert('RGB')
+        image = Image.blend(image, grain, 0.25)
+    return encode(image, fmt, quality)
+
+
+def encode(image, fmt='JPEG', quality=90):
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, quality=quality)
+    return buffer.getvalue()
+
+
+def reshoot(raw, quality=80):
+    """Re-encode an existing photo, which changes pixels but not what it shows."""
+    return encode(Image.open(io.BytesIO(raw)).convert('RGB'), quality=quality)
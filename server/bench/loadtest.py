@@ -0,0 +1,136 @@
+"""Replay add-item uploads against the stub model and break latency down by stage.
+
+    python -m server.bench.loadtest --items 20 --rounds 3 --concurrency 4 --latency-ms 800
+    python -m server.bench.loadtest --fixtures ~/grocery-photos --profile sample
+
+Each round posts every product/label pair to /analyze/item; rounds after the
+first hit the cache. Stage timings come from the Server-Timing header each
+response carries, so the breakdown is what the server itself measured.
+"""
+import argparse
+import dataclasses
+import io
+import re
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from ..app import create_app
+from ..config import Settings
+from ..instrumentation import STAGES
+from ..stub_model import StubServer
+from .bench_cache import percentile
+from .fixtures import make_photo
+
+TIMING_RE = re.compile(r'(\w+);(?:dur=([\d.]+)|desc="([^"]*)")')
+IMAGE_SUFFIXES = {'.jpg', '.jpeg', '.png', '.webp', '.heic'}
+
+
+def load_fixtures(directory):
+    """Pairs of consecutive photos in `directory`, in name order: product, then label."""
+    photos = sorted(path for path in Path(directory).iterdir() if path.suffix.lower() in IMAGE_SUFFIXES)
+    if len(photos) < 2:
+        raise SystemExit(f'{directory}: need at least one product/label pair of photos')
+    return [(photos[i].read_bytes(), photos[i + 1].read_bytes()) for i in range(0, len(photos) - 1, 2)]
+
+
+def parse_server_timing(header):
+    """`{'model': 12.5, ...}` durations in ms, and `{'tokens': 'prompt=..', ...}` descriptions."""
+    durations, descriptions = {}, {}
+    for name, duration, description in TIMING_RE.findall(header or ''):
+        if duration:
+            durations[name] = float(duration)
+        else:
+            descriptions[name] = description
+    return durations, descriptions
+
+
+def _counts(description):
+    return {key: int(value) for key, value in (part.split('=') for part in description.split())}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fixtures', type=Path, help='directory of photos (default: generated)')
+    parser.add_argument('--items', type=int, default=20, help='generated pairs when --fixtures is not given')
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--latency-ms', type=float, default=800.0)
+    parser.add_argument('--profile', choices=('cprofile', 'sample'),
+                        help='profile requests; one at a time, so --concurrency 1 profiles them all')
+    parser.add_argument('--profile-dir', type=Path, default=Path('profiles'),
+                        help='where --profile results are copied (default: ./profiles)')
+    args = parser.parse_args()
+
+    if args.fixtures:
+        pairs = load_fixtures(args.fixtures)
+    else:
+        pairs = [(make_photo(2 * i, size=(2016, 1512)), make_photo(2 * i + 1, size=(2016, 1512)))
+                 for i in range(args.items)]
+
+    with StubServer(latency=args.latency_ms / 1000) as stub, tempfile.TemporaryDirectory() as tmp:
+        settings = Settings(openai_api_key='stub', openai_base_url=stub.base_url, data_dir=Path(tmp))
+        settings = dataclasses.replace(settings, profile_requests=bool(args.profile))
+        app = create_app(settings)
+        local = threading.local()
+        headers = {'X-Profile': args.profile} if args.profile else {}
+
+        def post(pair):
+            # Test clients keep per-instance state, so one per worker thread
+            if not hasattr(local, 'client'):
+                local.client = app.test_client()
+            product, label = pair
+            started = time.perf_counter()
+            response = local.client.post(
+                '/analyze/item', headers=headers,
+                data={'product': (io.BytesIO(product), 'p.jpg'), 'nutrition': (io.BytesIO(label), 'l.jpg')},
+            )
+            elapsed = (time.perf_counter() - started) * 1000
+            return response.status_code, elapsed, response.headers.get('Server-Timing'), response.headers.get('X-Profile')
+
+        stages = defaultdict(list)
+        totals = defaultdict(int)
+        latencies, errors, profiled = [], 0, 0
+        started = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            for _ in range(args.rounds):
+                for status, elapsed, header, profile in pool.map(post, pairs):
+                    profiled += bool(profile) and profile != 'busy'
+                    if status != 200:
+                        errors += 1
+                        continue
+                    latencies.append(elapsed)
+                    durations, descriptions = parse_server_timing(header)
+                    for name in STAGES:
+                        stages[name].append(durations.get(name, 0.0))
+                    for name in ('tokens', 'bytes'):
+                        for key, value in _counts(descriptions.get(name, '')).items():
+                            totals[f'{name}.{key}'] += value
+        wall = time.perf_counter() - started
+
+        requests = len(latencies) + errors
+        print(f'{len(pairs)} pairs x {args.rounds} rounds, concurrency {args.concurrency}, '
+              f'stub latency {args.latency_ms:.0f}ms: {requests / wall:.1f} req/s, '
+              f'{errors} errors, {stub.calls} model calls')
+        print(f'  {"stage":<11}{"mean":>10}{"p50":>10}{"p95":>10}{"p99":>10}  (ms, summed across threads)')
+        for name in STAGES:
+            samples = stages[name] or [0.0]
+            print(f'  {name:<11}{statistics.fmean(samples):10.1f}{percentile(samples, 50):10.1f}'
+                  f'{percentile(samples, 95):10.1f}{percentile(samples, 99):10.1f}')
+        if latencies:
+            print(f'  {"request":<11}{statistics.fmean(latencies):10.1f}{percentile(latencies, 50):10.1f}'
+                  f'{percentile(latencies, 95):10.1f}{percentile(latencies, 99):10.1f}')
+        for name, value in sorted(totals.items()):
+            print(f'  {name:<22}{value:>12,}')
+        if args.profile:
+            shutil.copytree(settings.profile_dir, args.profile_dir, dirs_exist_ok=True)
+            print(f'  {profiled} of {requests} requests profiled, copied to {args.profile_dir}/')
+
+
+if __name__ == '__main__':
+    main()
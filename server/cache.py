@@ -0,0 +1,269 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .images import hamming
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    task TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    phash TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (task, digest)
+);
+CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used);
+
+CREATE TABLE IF NOT EXISTS uploads (
+    task TEXT NOT NULL,
+    upload TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    PRIMARY KEY (task, upload)
+);
+"""
+
+# Prune the SQLite table every this many writes rather than on each one
+PRUNE_EVERY = 256
+# Write memory hits' last_used back at most this many keys late
+TOUCH_EVERY = 256
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    near_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.near_hits + self.misses
+        return (self.hits + self.near_hits) / lookups if lookups else 0.0
+
+    def as_dict(self):
+        return {
+            'hits': self.hits,
+            'near_hits': self.near_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hit_rate, 4),
+        }
+
+
+@dataclass
+class _Entry:
+    phash: int
+    result: dict = field(repr=False)
+
+
+class ResultCache:
+    """Size-bounded LRU of analysis results, written through to SQLite.
+
+    Entries are keyed by (task, pixel digest). The perceptual hash is kept next
+    to each entry so a re-shot of the same product can be matched when the
+    caller allows a non-zero Hamming distance.
+
+    Uploads are also remembered by the sha256 of their raw bytes, pointing at
+    the entry they resolved to, so an identical file is answered by
+    `get_upload` without being decoded at all.
+
+    Memory hits do not touch SQLite; the keys they used are collected and
+    their `last_used` written in one batch on the next `put` (or after
+    `TOUCH_EVERY` hits), so pruning and warming see the hot entries as hot.
+    """
+
+    def __init__(self, path, max_entries=2048, disk_entries=50000):
+        self.max_entries = max_entries
+        self.disk_entries = disk_entries
+        self.stats = CacheStats()
+        self._memory = OrderedDict()
+        self._uploads = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._touched = {}
+        if str(path) != ':memory:':
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(SCHEMA)
+        self._warm()
+
+    def _warm(self):
+        rows = self._db.execute(
+            'SELECT task, digest, phash, payload FROM results ORDER BY last_used DESC LIMIT ?',
+            (self.max_entries,),
+        ).fetchall()
+        # Oldest first so the most recently used rows end up at the MRU end
+        for task, digest, phash, payload in reversed(rows):
+            self._memory[(task, digest)] = _Entry(int(phash, 16), json.loads(payload))
+
+    def get(self, task, fingerprint, max_distance=0):
+        """Return `(result, status)` where status is 'hit', 'near' or None."""
+        key = (task, fingerprint.digest)
+        with self._lock:
+            result = self._exact(key)
+            if result is not None:
+                return result, 'hit'
+
+            if max_distance > 0:
+                near = self._nearest(task, fingerprint.phash, max_distance)
+                if near is not None:
+                    self._memory.move_to_end(near)
+                    self._touch(near)
+                    self.stats.near_hits += 1
+                    return self._memory[near].result, 'near'
+
+            self.stats.misses += 1
+            return None, None
+
+    def get_upload(self, task, upload):
+        """Return `(result, 'hit')` for raw upload bytes seen before, else `(None, None)`.
+
+        Not finding one is not counted as a miss; the caller goes on to `get`.
+        """
+        key = (task, upload)
+        with self._lock:
+            digest = self._uploads.get(key)
+            if digest is None:
+                row = self._db.execute(
+                    'SELECT digest FROM uploads WHERE task = ? AND upload = ?', key
+                ).fetchone()
+                if row is None:
+                    return None, None
+                digest = row[0]
+            result = self._exact((task, digest))
+            if result is None:
+                return None, None
+            self._remember_upload(key, digest)
+            return result, 'hit'
+
+    def link(self, task, upload, fingerprint):
+        """Point raw upload bytes at the entry their pixels matched."""
+        with self._lock:
+            self._link(task, upload, fingerprint.digest)
+            self._db.commit()
+
+    def put(self, task, fingerprint, result, upload=None):
+        key = (task, fingerprint.digest)
+        now = time.time()
+        with self._lock:
+            self._remember(key, _Entry(fingerprint.phash, result))
+            self._touched.pop(key, None)
+            self._flush_touched()
+            self._db.execute(
+                'INSERT OR REPLACE INTO results (task, digest, phash, payload, created_at, last_used) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (task, fingerprint.digest, f'{fingerprint.phash:064x}', json.dumps(result), now, now),
+            )
+            if upload is not None:
+                self._link(task, upload, fingerprint.digest)
+            self._writes += 1
+            if self._writes % PRUNE_EVERY == 0:
+                self._prune()
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._uploads.clear()
+            self._touched.clear()
+            self._db.execute('DELETE FROM results')
+            self._db.execute('DELETE FROM uploads')
+            self._db.commit()
+            self.stats = CacheStats()
+
+    def close(self):
+        with self._lock:
+            self._flush_touched()
+            self._db.commit()
+            self._db.close()
+
+    def __len__(self):
+        return len(self._memory)
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _exact(self, key):
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+            self._touch(key)
+            self.stats.hits += 1
+            return entry.result
+
+        row = self._db.execute(
+            'SELECT phash, payload FROM results WHERE task = ? AND digest = ?', key
+        ).fetchone()
+        if row is None:
+            return None
+        entry = _Entry(int(row[0], 16), json.loads(row[1]))
+        self._remember(key, entry)
+        self._db.execute(
+            'UPDATE results SET last_used = ? WHERE task = ? AND digest = ?',
+            (time.time(), *key),
+        )
+        self._db.commit()
+        self.stats.hits += 1
+        self.stats.disk_hits += 1
+        return entry.result
+
+    def _link(self, task, upload, digest):
+        self._remember_upload((task, upload), digest)
+        self._db.execute(
+            'INSERT OR REPLACE INTO uploads (task, upload, digest) VALUES (?, ?, ?)', (task, upload, digest)
+        )
+
+    def _remember_upload(self, key, digest):
+        self._uploads[key] = digest
+        self._uploads.move_to_end(key)
+        while len(self._uploads) > self.max_entries:
+            self._uploads.popitem(last=False)
+
+    def _touch(self, key):
+        self._touched[key] = time.time()
+        if len(self._touched) >= TOUCH_EVERY:
+            self._flush_touched()
+            self._db.commit()
+
+    def _flush_touched(self):
+        if self._touched:
+            self._db.executemany(
+                'UPDATE results SET last_used = ? WHERE task = ? AND digest = ?',
+                [(used, *key) for key, used in self._touched.items()],
+            )
+            self._touched.clear()
+
+    def _nearest(self, task, phash, max_distance):
+        best_key, best_distance = None, max_distance + 1
+        for key, entry in self._memory.items():
+            if key[0] != task:
+                continue
+            distance = hamming(entry.phash, phash)
+            if distance < best_distance:
+                best_key, best_distance = key, distance
+                if distance == 0:
+                    break
+        return best_key
+
+    def _prune(self):
+        self._flush_touched()
+        self._db.execute(
+            'DELETE FROM results WHERE rowid IN ('
+            'SELECT rowid FROM results ORDER BY last_used DESC LIMIT -1 OFFSET ?)',
+            (self.disk_entries,),
+        )
+        self._db.execute(
+            'DELETE FROM uploads WHERE NOT EXISTS ('
+            'SELECT 1 FROM results WHERE results.task = uploads.task AND results.digest = uploads.digest)'
+        )
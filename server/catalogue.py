@@ -0,0 +1,368 @@
+"""Every product the app has identified, searchable by name or barcode.
+
+Rows live in SQLite; the search index lives in memory and is rebuilt from the
+rows at startup. Names are indexed per word: a sorted vocabulary answers
+prefix queries with two bisects, and a trigram index over that vocabulary
+finds words one or two typos away. Both work on distinct words rather than
+products, so a query touches a few hundred keys however large the catalogue.
+"""
+import bisect
+import heapq
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+from .errors import APIError
+from .storage import NUTRITION_COLUMNS
+
+WORD_RE = re.compile(r'[a-z0-9]+')
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    description TEXT,
+    {', '.join(f'{column} {"TEXT" if column == "serving_size" else "REAL"}' for column in NUTRITION_COLUMNS.values())},
+    barcode TEXT UNIQUE,
+    seen INTEGER NOT NULL DEFAULT 1,
+    updated_at REAL NOT NULL
+);
+"""
+
+# Up to this many candidate products are ranked; above it, products are walked
+# most-recent-first and the walk stops at `limit` matches
+SCAN_LIMIT = 512
+
+# Queries whose narrowest word matches more products than this skip the set
+# intersections and walk instead
+UNION_LIMIT = 20000
+
+# Fuzzy candidates are checked with an edit-distance DP; only the best few by
+# trigram overlap are worth the cost
+FUZZY_CANDIDATES = 64
+
+
+def words(text):
+    """Lower-case ASCII words: 'Crème Fraîche 200ml' -> ['creme', 'fraiche', '200ml']."""
+    ascii_text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode()
+    return WORD_RE.findall(ascii_text.lower())
+
+
+def trigrams(word):
+    # Anchored at the start only, since queries are usually a prefix being typed
+    padded = f'${word}'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)} or {padded}
+
+
+def max_typos(token):
+    return 0 if len(token) < 4 else 1 if len(token) < 8 else 2
+
+
+def prefix_distance(token, word, limit):
+    """Smallest edit distance between `token` and any prefix of `word`.
+
+    Swapped neighbours count as one edit ('granloa' is one away from
+    'granola'), since that is the commonest slip when typing.
+    """
+    # Prefixes longer than this are already too far away
+    word = word[:len(token) + limit]
+    far = limit + 1
+    before, previous = None, [min(j, far) for j in range(len(word) + 1)]
+    for i, char in enumerate(token, 1):
+        # Only cells within `limit` of the diagonal can stay under the limit
+        current = [min(i, far)] + [far] * len(word)
+        for j in range(max(1, i - limit), min(len(word), i + limit) + 1):
+            other = word[j - 1]
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char != other))
+            if before is not None and j > 1 and char == word[j - 2] and token[i - 2] == other:
+                cost = min(cost, before[j - 2] + 1)
+            current[j] = cost
+        if min(current) > limit:
+            return far
+        before, previous = previous, current
+    return min(min(previous), far)
+
+
+def near_prefix(token, word, limit):
+    """Whether `token` is within `limit` edits of a prefix of `word`.
+
+    One edit, the common case, is checked with a few slice comparisons
+    around the first mismatch instead of the full DP.
+    """
+    if limit != 1:
+        return prefix_distance(token, word, limit) <= limit
+    n = len(token)
+    i = 0
+    while i < n and i < len(word) and token[i] == word[i]:
+        i += 1
+    if i == n:
+        return True
+    return (
+        token[i + 1:] == word[i + 1:n]  # wrong letter
+        or token[i + 1:] == word[i:n - 1]  # extra letter
+        or token[i:] == word[i + 1:n + 1]  # missing letter
+        or token[i:i + 2] == word[i:i + 2][::-1] and token[i + 2:] == word[i + 2:n]  # swapped letters
+    )
+
+
+def normalise_barcode(code):
+    """Return a UPC/EAN as a GTIN-13 (or EAN-8), or None if the check digit is wrong.
+
+    A 12-digit UPC-A and the 13-digit EAN with a leading zero are the same
+    product, so both are stored as the EAN.
+    """
+    digits = re.sub(r'[\s-]', '', str(code or ''))
+    if not digits.isdigit():
+        return None
+    if len(digits) == 12:
+        digits = '0' + digits
+    elif len(digits) == 14 and digits.startswith('0'):
+        digits = digits[1:]
+    if len(digits) not in (8, 13):
+        return None
+    body, check = digits[:-1], int(digits[-1])
+    # GTIN check digit: weights 3,1,3,... from the right of the body
+    total = sum(int(digit) * (3 if i % 2 == 0 else 1) for i, digit in enumerate(reversed(body)))
+    return digits if (10 - total % 10) % 10 == check else None
+
+
+@dataclass
+class Product:
+    id: int
+    name: str
+    words: frozenset
+    description: str | None = None
+    nutrition: dict | None = None
+    barcode: str | None = None
+    seen: int = 1
+
+    def as_dict(self):
+        nutrition = self.nutrition or {}
+        return {
+            'id': self.id,
+            'name': self.name,
+            'description': self.description,
+            'barcode': self.barcode,
+            'nutritionInfo': nutrition if any(value is not None for value in nutrition.values()) else None,
+            'seen': self.seen,
+        }
+
+
+class SearchIndex:
+    """In-memory word index over products for typo-tolerant prefix search."""
+
+    def __init__(self):
+        self._products = {}
+        self._seen = {}
+        # Most recently seen last; large result sets are taken from the end
+        self._recent = OrderedDict()
+        self._postings = {}
+        self._vocabulary = []
+        self._trigrams = {}
+
+    def __len__(self):
+        return len(self._products)
+
+    def get(self, product_id):
+        return self._products.get(product_id)
+
+    def add(self, product):
+        old = self._products.get(product.id)
+        if old is not None:
+            for word in old.words - product.words:
+                self._postings[word].discard(product.id)
+        for word in product.words:
+            posting = self._postings.get(word)
+            if posting is None:
+                posting = self._postings[word] = set()
+                bisect.insort(self._vocabulary, word)
+                for gram in trigrams(word):
+                    self._trigrams.setdefault(gram, set()).add(word)
+            posting.add(product.id)
+        self._products[product.id] = product
+        self._seen[product.id] = product.seen
+        self._recent[product.id] = None
+        self._recent.move_to_end(product.id)
+
+    def _expand(self, token):
+        """Vocabulary words `token` may stand for: its prefix matches, else near misses."""
+        start = bisect.bisect_left(self._vocabulary, token)
+        end = bisect.bisect_left(self._vocabulary, token + '\x7f', start)
+        if end > start:
+            return set(self._vocabulary[start:end])
+        limit = max_typos(token)
+        if not limit:
+            return set()
+        grams = trigrams(token)
+        overlap = Counter()
+        for gram in grams:
+            overlap.update(self._trigrams.get(gram, ()))
+        # Each typo can spoil up to three of the token's trigrams
+        needed = max(1, len(grams) - 3 * limit)
+        candidates = [word for word, count in overlap.items() if count >= needed]
+        if len(candidates) > FUZZY_CANDIDATES:
+            candidates = heapq.nlargest(FUZZY_CANDIDATES, candidates, key=overlap.__getitem__)
+        return {word for word in candidates if near_prefix(token, word, limit)}
+
+    def _estimate(self, expansion):
+        total = 0
+        for word in expansion:
+            total += len(self._postings[word])
+            if total > UNION_LIMIT:
+                break
+        return total
+
+    def _walk(self, expansions, limit, candidates=None):
+        """Most recently seen matches, for queries too broad to rank."""
+        found = []
+        for product_id in reversed(self._recent):
+            if candidates is not None:
+                if product_id not in candidates:
+                    continue
+                product = self._products[product_id]
+            else:
+                product = self._products[product_id]
+                if any(product.words.isdisjoint(expansion) for expansion in expansions):
+                    continue
+            found.append(product)
+            if len(found) == limit:
+                break
+        return found
+
+    def search(self, query, limit=8):
+        tokens = list(dict.fromkeys(words(query)))
+        if not tokens:
+            return []
+        expansions = [self._expand(token) for token in tokens]
+        if not all(expansions):
+            return []
+
+        sizes = [self._estimate(expansion) for expansion in expansions]
+        order = sorted(range(len(sizes)), key=sizes.__getitem__)
+        if sizes[order[0]] > UNION_LIMIT or (len(order) == 1 and sizes[order[0]] > SCAN_LIMIT):
+            return self._walk(expansions, limit)
+
+        # Set algebra runs in C: intersect the narrowest word with each of the
+        # others, one posting at a time so every step is bounded by the smaller side
+        narrowest = [self._postings[word] for word in expansions[order[0]]]
+        candidates = narrowest[0] if len(narrowest) == 1 else set().union(*narrowest)
+        for index in order[1:]:
+            candidates = set().union(*(candidates & self._postings[word] for word in expansions[index]))
+        if len(candidates) > SCAN_LIMIT:
+            return self._walk(expansions, limit, candidates)
+
+        # Products containing every typed whole word first ('milk' before
+        # 'milkshake'), then the rest; each by how often it has been seen
+        whole = [candidates & self._postings[token] for token in tokens if token in self._postings]
+        best = set.intersection(*whole) if whole else set()
+        ranked = heapq.nlargest(limit, best, key=self._seen.__getitem__)
+        if len(ranked) < limit:
+            ranked += heapq.nlargest(limit - len(ranked), candidates - best, key=self._seen.__getitem__)
+        return [self._products[product_id] for product_id in ranked]
+
+
+class Catalogue:
+    """Products from every analysis, merged by normalised name.
+
+    Seeing a product again bumps its count and fills in anything new (a
+    description, nutrition, a barcode) without erasing what was known.
+    """
+
+    def __init__(self, path):
+        if str(path) != ':memory:':
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(SCHEMA)
+        self.index = SearchIndex()
+        self._barcodes = {}
+        for row in self._db.execute('SELECT * FROM products ORDER BY updated_at'):
+            self._load(row)
+
+    def __len__(self):
+        return len(self.index)
+
+    def _load(self, row):
+        product = Product(
+            id=row['id'],
+            name=row['name'],
+            words=frozenset(words(row['name'])),
+            description=row['description'],
+            nutrition={key: row[column] for key, column in NUTRITION_COLUMNS.items()},
+            barcode=row['barcode'],
+            seen=row['seen'],
+        )
+        old = self.index.get(product.id)
+        if old is not None and old.barcode and old.barcode != product.barcode:
+            self._barcodes.pop(old.barcode, None)
+        self.index.add(product)
+        if product.barcode:
+            self._barcodes[product.barcode] = product.id
+        return product
+
+    def record(self, fields):
+        """Add or update a product from an analysis result or the API.
+
+        `fields` has `name` plus optional `description`, `barcode` and either
+        the nutrition keys at the top level (as analysis returns them) or a
+        `nutritionInfo` dict (as items carry them). Returns the product, or
+        None when there is no usable name.
+        """
+        name = (fields.get('name') or '').strip()
+        key = ' '.join(words(name))
+        if not key:
+            return None
+        nutrition = fields.get('nutritionInfo') or fields
+        columns = {'name': name, 'updated_at': time.time()}
+        if fields.get('description'):
+            columns['description'] = fields['description']
+        columns.update({
+            column: nutrition[field] for field, column in NUTRITION_COLUMNS.items()
+            if nutrition.get(field) is not None
+        })
+        barcode = normalise_barcode(fields.get('barcode'))
+        if barcode:
+            columns['barcode'] = barcode
+
+        with self._lock, self._db as db:
+            if barcode:
+                # A barcode names exactly one product; move it if it was elsewhere
+                db.execute('UPDATE products SET barcode = NULL WHERE barcode = ? AND key != ?', (barcode, key))
+            names = ', '.join(['key', *columns])
+            updates = ', '.join(f'{column} = excluded.{column}' for column in columns)
+            db.execute(
+                f'INSERT INTO products ({names}) VALUES ({", ".join("?" for _ in range(len(columns) + 1))}) '
+                f'ON CONFLICT (key) DO UPDATE SET {updates}, seen = seen + 1',
+                (key, *columns.values()),
+            )
+            row = db.execute('SELECT * FROM products WHERE key = ?', (key,)).fetchone()
+            previous = self._barcodes.get(barcode)
+            if previous is not None and previous != row['id']:
+                self.index.get(previous).barcode = None
+            return self._load(row)
+
+    def search(self, query, limit=8):
+        with self._lock:
+            return [product.as_dict() for product in self.index.search(query, limit)]
+
+    def barcode(self, code):
+        barcode = normalise_barcode(code)
+        if barcode is None:
+            raise APIError(f"'{code}' is not a valid UPC or EAN barcode")
+        with self._lock:
+            product_id = self._barcodes.get(barcode)
+            if product_id is None:
+                raise APIError('No product with that barcode', 404)
+            return self.index.get(product_id).as_dict()
+
+    def close(self):
+        self._db.close()
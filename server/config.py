@@ -0,0 +1,99 @@
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# Pick up the same .env file the React app uses so the key only lives in one place
+load_dotenv()
+
+DEFAULT_DATA_DIR = Path(__file__).resolve().parent / 'data'
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, '') else default
+
+
+@dataclass(frozen=True)
+class Settings:
+    openai_api_key: str = ''
+    openai_base_url: str | None = None
+    model: str = 'gpt-4o'
+    request_timeout: float = 60.0
+    data_dir: Path = DEFAULT_DATA_DIR
+    # In-memory LRU entries; SQLite keeps up to `cache_disk_entries`
+    cache_max_entries: int = 2048
+    cache_disk_entries: int = 50000
+    # Max Hamming distance (out of 256 bits) for a near-duplicate product photo
+    # to reuse a cached result. Nutrition labels always need an exact match.
+    product_phash_distance: int = 6
+    # Downscale and re-encode uploads before they reach the cache and model
+    preprocess: bool = True
+    product_max_side: int = 512
+    nutrition_max_side: int = 1536
+    image_format: str = 'jpeg'
+    # Send product photo and label in one model request; when off, the two
+    # single-image analyses run concurrently instead
+    combined_analysis: bool = True
+    # Ask for JSON-schema structured output; turn off for backends without it
+    structured_outputs: bool = True
+    # Client-side token bucket per API key, shared by single and batch requests
+    model_rate_per_sec: float = 8.0
+    model_burst: int = 8
+    model_max_retries: int = 4
+    batch_workers: int = 4
+    batch_max_items: int = 200
+    batch_max_bytes: int = 256 * 1024 * 1024
+    cors_origin: str = '*'
+    # Honour `X-Profile` request headers; only for debugging, never in production
+    profile_requests: bool = False
+
+    @property
+    def cache_path(self):
+        return self.data_dir / 'analysis_cache.sqlite3'
+
+    @property
+    def lists_path(self):
+        return self.data_dir / 'groceries.sqlite3'
+
+    @property
+    def catalogue_path(self):
+        return self.data_dir / 'catalogue.sqlite3'
+
+    @property
+    def profile_dir(self):
+        return self.data_dir / 'profiles'
+
+    @property
+    def blob_dir(self):
+        return self.data_dir / 'blobs'
+
+    @property
+    def thumbnail_dir(self):
+        return self.data_dir / 'thumbnails'
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            openai_api_key=os.environ.get('OPENAI_API_KEY') or os.environ.get('REACT_APP_OPENAI_API_KEY', ''),
+            openai_base_url=os.environ.get('OPENAI_BASE_URL') or None,
+            model=os.environ.get('ANALYSIS_MODEL', 'gpt-4o'),
+            data_dir=Path(os.environ.get('GROCERY_DATA_DIR', DEFAULT_DATA_DIR)),
+            cache_max_entries=_env_int('ANALYSIS_CACHE_ENTRIES', 2048),
+            cache_disk_entries=_env_int('ANALYSIS_CACHE_DISK_ENTRIES', 50000),
+            product_phash_distance=_env_int('PRODUCT_PHASH_DISTANCE', 6),
+            preprocess=os.environ.get('IMAGE_PREPROCESS', '1') != '0',
+            product_max_side=_env_int('PRODUCT_MAX_SIDE', 512),
+            nutrition_max_side=_env_int('NUTRITION_MAX_SIDE', 1536),
+            image_format=os.environ.get('IMAGE_FORMAT', 'jpeg'),
+            combined_analysis=os.environ.get('COMBINED_ANALYSIS', '1') != '0',
+            structured_outputs=os.environ.get('STRUCTURED_OUTPUTS', '1') != '0',
+            model_rate_per_sec=float(os.environ.get('MODEL_RATE_PER_SEC', 8.0)),
+            model_burst=_env_int('MODEL_BURST', 8),
+            model_max_retries=_env_int('MODEL_MAX_RETRIES', 4),
+            batch_workers=_env_int('BATCH_WORKERS', 4),
+            batch_max_items=_env_int('BATCH_MAX_ITEMS', 200),
+            cors_origin=os.environ.get('CORS_ORIGIN', '*'),
+            profile_requests=os.environ.get('PROFILE_REQUESTS', '0') == '1',
+        )
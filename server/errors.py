@@ -0,0 +1,35 @@
+from flask import jsonify
+
+
+class APIError(Exception):
+    """Error with an HTTP status that the app turns into a JSON response."""
+
+    status_code = 400
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.message = message
+        if status_code is not None:
+            self.status_code = status_code
+
+
+class AnalysisError(APIError):
+    """The model call failed or returned something we could not use."""
+
+    status_code = 502
+
+
+class RateLimitedError(AnalysisError):
+    """The model provider answered 429; `retry_after` is in seconds if it said."""
+
+    status_code = 429
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def register_error_handlers(app):
+    @app.errorhandler(APIError)
+    def handle_api_error(error):
+        return jsonify({'error': error.message}), error.status_code
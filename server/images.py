@@ -0,0 +1,93 @@
+import base64
+import binascii
+import hashlib
+import io
+import re
+from dataclasses import dataclass
+
+from PIL import Image, UnidentifiedImageError
+
+from .errors import APIError
+
+DATA_URL_RE = re.compile(r'^data:(?P<mime>[\w/+.-]+)?(?:;[\w=-]+)*;base64,', re.IGNORECASE)
+
+# dHash grid: 17x16 samples -> 16x16 = 256 comparison bits
+HASH_SIZE = 16
+
+
+@dataclass(frozen=True)
+class Fingerprint:
+    # sha256 of the decoded pixels, so re-encodes and EXIF edits of the same
+    # photo still map to the same entry
+    digest: str
+    # 256-bit difference hash used for near-duplicate matching
+    phash: int
+
+
+def sniff_mime(head):
+    """Guess an image MIME type from its first bytes."""
+    if head.startswith(b'\xff\xd8'):
+        return 'image/jpeg'
+    if head.startswith(b'\x89PNG'):
+        return 'image/png'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    return 'application/octet-stream'
+
+
+def decode_data_url(data_url):
+    """Turn the `readAsDataURL` string the browser sends into raw bytes."""
+    if not isinstance(data_url, str) or not data_url:
+        raise APIError('Expected a base64 image data URL')
+    match = DATA_URL_RE.match(data_url)
+    payload = data_url[match.end():] if match else data_url
+    try:
+        return base64.b64decode(payload, validate=False)
+    except (binascii.Error, ValueError) as error:
+        raise APIError(f'Image is not valid base64: {error}') from error
+
+
+def open_image(raw):
+    try:
+        image = Image.open(io.BytesIO(raw))
+        image.load()
+    except (UnidentifiedImageError, OSError) as error:
+        raise APIError(f'Could not decode image: {error}') from error
+    return image
+
+
+def difference_hash(image, hash_size=HASH_SIZE):
+    small = image.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+    pixels = small.tobytes()
+    bits = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            bits = (bits << 1) | (pixels[offset + col] < pixels[offset + col + 1])
+    return bits
+
+
+def fingerprint(image):
+    rgb = image if image.mode == 'RGB' else image.convert('RGB')
+    digest = hashlib.sha256()
+    digest.update(f'{rgb.width}x{rgb.height}:'.encode())
+    digest.update(rgb.tobytes())
+    return Fingerprint(digest=digest.hexdigest(), phash=difference_hash(rgb))
+
+
+def upload_digest(stream, chunk_size=1 << 20):
+    """Return `(sha256 hex, size)` of a seekable upload, leaving it where it was."""
+    position = stream.tell()
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        digest.update(chunk)
+        size += len(chunk)
+    stream.seek(position)
+    return digest.hexdigest(), size
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
@@ -0,0 +1,167 @@
+import asyncio
+import contextvars
+import io
+import mimetypes
+import queue
+import re
+import threading
+import time
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import PurePosixPath
+
+from .errors import APIError
+
+IMAGE_SUFFIXES = {'.jpg', '.jpeg', '.png', '.webp', '.heic', '.gif', '.bmp'}
+
+# "milk-label.jpg", "milk_nutrition.png", "milk/label.jpg" are all milk's label
+LABEL_RE = re.compile(r'(?:^|[-_. ])(label|nutrition)$', re.IGNORECASE)
+
+
+@dataclass
+class Source:
+    """A photo in a batch, opened lazily so only in-flight items are in memory."""
+
+    name: str
+    opener: object = field(repr=False)
+
+    @property
+    def mime(self):
+        return mimetypes.guess_type(self.name)[0] or 'image/jpeg'
+
+    def open(self):
+        return self.opener(), self.mime
+
+
+@dataclass
+class BatchItem:
+    index: int
+    key: str
+    sources: dict = field(default_factory=dict)
+
+
+def item_key(name):
+    """Return `(key, task)` for a file name inside a batch.
+
+    Keys keep the folder, so `week1/milk.jpg` and `week2/milk.jpg` are two items.
+    """
+    path = PurePosixPath(name)
+    folder = '' if str(path.parent) == '.' else f'{path.parent}/'
+    stem = path.stem
+    if LABEL_RE.search(stem):
+        base = LABEL_RE.sub('', stem)
+        return (f'{folder}{base}' if base else str(path.parent)), 'nutrition'
+    if stem.lower() in ('product', 'photo', 'front') and folder:
+        return str(path.parent), 'product'
+    return f'{folder}{stem}', 'product'
+
+
+def group_sources(sources):
+    """Pair product photos with their labels by file name, keeping upload order."""
+    grouped = OrderedDict()
+    for source in sources:
+        path = PurePosixPath(source.name)
+        # Skip non-images and the resource forks macOS adds to zips
+        if path.suffix.lower() not in IMAGE_SUFFIXES or path.name.startswith('._') or '__MACOSX' in path.parts:
+            continue
+        key, task = item_key(source.name)
+        item = grouped.setdefault(key, BatchItem(len(grouped), key))
+        if task in item.sources:
+            raise APIError(f"Two {task} photos for '{key}' in the batch")
+        item.sources[task] = source
+    return list(grouped.values())
+
+
+def zip_sources(stream, max_bytes):
+    try:
+        archive = zipfile.ZipFile(stream)
+    except zipfile.BadZipFile as error:
+        raise APIError(f'Archive is not a valid zip: {error}') from error
+    entries = [info for info in archive.infolist() if not info.is_dir()]
+    # Refuse zip bombs before anything is decompressed
+    if sum(info.file_size for info in entries) > max_bytes:
+        raise APIError('Archive is too large to ingest', 413)
+    lock = threading.Lock()
+
+    def opener(info):
+        def read():
+            # ZipFile shares one file handle between readers
+            with lock:
+                return io.BytesIO(archive.read(info))
+        return read
+
+    return [Source(info.filename, opener(info)) for info in entries]
+
+
+def upload_sources(uploads):
+    sources = []
+    for index, upload in enumerate(uploads):
+        def read(upload=upload):
+            upload.stream.seek(0)
+            return upload.stream
+        # Unnamed uploads are told apart by position, typed by their MIME type
+        name = upload.filename or f'upload{index}{mimetypes.guess_extension(upload.mimetype or "") or ".jpg"}'
+        sources.append(Source(name, read))
+    return sources
+
+
+class BatchIngester:
+    """Analyses batch items on a bounded pool of asyncio workers.
+
+    `stream` yields one result dict per item as soon as it finishes, so the
+    HTTP response can flush rows to the client while the rest are in flight.
+    """
+
+    def __init__(self, service, workers=4):
+        self.service = service
+        self.workers = workers
+
+    def _process(self, item):
+        started = time.perf_counter()
+        row = {'index': item.index, 'key': item.key}
+        try:
+            sources = {task: source.open() for task, source in item.sources.items()}
+            analysis, statuses, mode = self.service.analyze_item(sources)
+        except APIError as error:
+            row.update(status='error', error=error.message)
+        except Exception as error:  # noqa: BLE001 - one bad photo must not end the stream
+            row.update(status='error', error=f'Failed to process item: {error}')
+        else:
+            row.update(status='ok', item=analysis.model_dump(), cache=statuses, mode=mode)
+        row['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        return row
+
+    async def _run(self, items, emit, stop):
+        # Size the thread pool to the worker count rather than the CPU count
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(self.workers))
+        pending = asyncio.Queue()
+        for item in items:
+            pending.put_nowait(item)
+
+        async def worker():
+            while not stop.is_set():
+                try:
+                    item = pending.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                emit(await asyncio.to_thread(self._process, item))
+
+        await asyncio.gather(*(worker() for _ in range(min(self.workers, len(items)))))
+
+    def stream(self, items):
+        results = queue.Queue()
+        stop = threading.Event()
+        # Carry the request's context over so the items report to its trace
+        context = contextvars.copy_context()
+        thread = threading.Thread(
+            target=context.run, args=(asyncio.run, self._run(items, results.put, stop)), daemon=True
+        )
+        thread.start()
+        try:
+            for _ in items:
+                yield results.get()
+        finally:
+            # Client went away: let in-flight items finish but start no more
+            stop.set()
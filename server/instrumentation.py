@@ -0,0 +1,339 @@
+"""Per-request stage timings, token and image-size accounting, and profiling.
+
+Code anywhere in the analysis path wraps work in `stage(name)` and reports
+`record_tokens` / `record_image`. These land on the current request's `Trace`
+(a context variable, so `asyncio.to_thread` workers report to the request
+that started them) and in the app's Prometheus histograms. The trace goes
+back to the client as a `Server-Timing` header; the histograms are served at
+`/metrics`.
+"""
+import cProfile
+import contextvars
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+from flask import Response, current_app, g, request
+
+STAGES = ('decode', 'preprocess', 'cache', 'model', 'parse', 'persist')
+
+SECONDS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+TOKENS = (50, 100, 250, 500, 1000, 2000, 4000, 8000)
+BYTES = (16 << 10, 64 << 10, 256 << 10, 1 << 20, 4 << 20, 16 << 20)
+
+TRACE_ID_RE = re.compile(r'^[\w-]{1,64}$')
+PROFILERS = ('cprofile', 'sample')
+
+# Blueprint -> pipeline label on the stage histogram, so thumbnail renders and
+# list saves do not land among the analysis timings
+PIPELINES = {'analyze': 'analysis', 'ingest': 'analysis'}
+
+# Frames from this package, used to keep the sampler's output to our own work
+PACKAGE_DIR = str(Path(__file__).parent)
+
+_current = contextvars.ContextVar('trace', default=None)
+# One profiled request at a time: from Python 3.12 a second cProfile cannot
+# be enabled while one is active, and both samplers would see both requests
+_profiling = threading.Lock()
+
+
+def _labels(names, values):
+    return ','.join(f'{name}="{value}"' for name, value in zip(names, values))
+
+
+class Histogram:
+    """A Prometheus histogram with cumulative buckets, keyed by label values."""
+
+    def __init__(self, name, help, buckets, labels=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labels = tuple(labels)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.setdefault(labels, [[0] * len(self.buckets), 0.0, 0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *labels):
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for labels, (buckets, total, count) in sorted(self._series.items()):
+                prefix = _labels(self.labels, labels)
+                prefix = prefix + ',' if prefix else ''
+                for bound, hits in zip(self.buckets, buckets):
+                    lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {hits}')
+                lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+                suffix = f'{{{prefix.rstrip(",")}}}' if prefix else ''
+                lines.append(f'{self.name}_sum{suffix} {total}')
+                lines.append(f'{self.name}_count{suffix} {count}')
+        return '\n'.join(lines)
+
+
+class Metrics:
+    """The histograms one app instance exports."""
+
+    def __init__(self):
+        self.stage_seconds = Histogram(
+            'analysis_stage_seconds', 'Time spent in each stage, by pipeline.', SECONDS, ('pipeline', 'stage'))
+        self.request_seconds = Histogram(
+            'http_request_seconds', 'Time to produce a response, by endpoint.', SECONDS,
+            ('endpoint', 'method', 'status'))
+        self.model_tokens = Histogram(
+            'analysis_model_tokens', 'Tokens per model call.', TOKENS, ('kind',))
+        self.image_bytes = Histogram(
+            'analysis_image_bytes', 'Image size as uploaded and as sent to the model.', BYTES, ('kind',))
+
+    def render(self):
+        histograms = (self.stage_seconds, self.request_seconds, self.model_tokens, self.image_bytes)
+        return '\n'.join(histogram.render() for histogram in histograms) + '\n'
+
+
+class Trace:
+    """Everything one request spent, summed across the threads it used."""
+
+    def __init__(self, metrics, trace_id=None, pipeline='analysis'):
+        self.id = trace_id or uuid.uuid4().hex[:16]
+        self.metrics = metrics
+        self.pipeline = pipeline
+        self.started = time.perf_counter()
+        self.stages = Counter()
+        self.tokens = Counter()
+        self.image_bytes = Counter()
+        self._lock = threading.Lock()
+
+    def add_stage(self, name, seconds):
+        with self._lock:
+            self.stages[name] += seconds
+        self.metrics.stage_seconds.observe(seconds, self.pipeline, name)
+
+    def add_tokens(self, prompt, completion):
+        with self._lock:
+            self.tokens.update(prompt=prompt, completion=completion)
+        self.metrics.model_tokens.observe(prompt, 'prompt')
+        self.metrics.model_tokens.observe(completion, 'completion')
+
+    def add_image(self, kind, size):
+        with self._lock:
+            self.image_bytes[kind] += size
+        self.metrics.image_bytes.observe(size, kind)
+
+    def as_dict(self):
+        """The same breakdown as `server_timing`, for a streamed response's final row."""
+        with self._lock:
+            return {
+                'id': self.id,
+                'stages_ms': {name: round(self.stages[name] * 1000, 1) for name in STAGES if name in self.stages},
+                'total_ms': round((time.perf_counter() - self.started) * 1000, 1),
+                'tokens': dict(self.tokens),
+                'image_bytes': dict(self.image_bytes),
+            }
+
+    def server_timing(self):
+        """`Server-Timing` value: stage durations in ms, plus tokens and bytes as descriptions."""
+        elapsed = (time.perf_counter() - self.started) * 1000
+        parts = [f'{name};dur={self.stages[name] * 1000:.1f}' for name in STAGES if name in self.stages]
+        parts.append(f'total;dur={elapsed:.1f}')
+        if self.tokens:
+            parts.append(f'tokens;desc="prompt={self.tokens["prompt"]} completion={self.tokens["completion"]}"')
+        if self.image_bytes:
+            parts.append('bytes;desc="' + ' '.join(f'{kind}={size}' for kind, size in self.image_bytes.items()) + '"')
+        return ', '.join(parts)
+
+
+def current_trace():
+    return _current.get()
+
+
+@contextmanager
+def stage(name):
+    """Time a block as one of `STAGES` on the current request, if there is one."""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add_stage(name, time.perf_counter() - started)
+
+
+def record_tokens(prompt, completion):
+    trace = _current.get()
+    if trace is not None:
+        trace.add_tokens(prompt or 0, completion or 0)
+
+
+def record_image(kind, size):
+    """`kind` is 'upload' for the bytes received or 'model' for the bytes sent on."""
+    trace = _current.get()
+    if trace is not None:
+        trace.add_image(kind, size)
+
+
+class Sampler:
+    """Samples the stacks of every thread running our code at a fixed interval.
+
+    Before Python 3.12 cProfile only sees the thread that enabled it, which
+    misses the worker threads analysis runs on; from 3.12 it sees every
+    thread but counts calls exactly, at a much higher overhead than
+    sampling. Output is in the folded format flame graph tools
+    (flamegraph.pl, speedscope) read. Like cProfile on 3.12, it records
+    every thread, so run it on a quiet server.
+    """
+
+    def __init__(self, interval=0.002):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack, ours = [], False
+                while frame is not None:
+                    code = frame.f_code
+                    ours = ours or code.co_filename.startswith(PACKAGE_DIR)
+                    stack.append(f'{Path(code.co_filename).stem}:{code.co_name}')
+                    frame = frame.f_back
+                if ours:
+                    self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def save(self, path):
+        path.write_text(''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common()))
+
+
+def _start_profile(kind):
+    """Return `(kind, profiler)`, or None if another request is being profiled."""
+    if not _profiling.acquire(blocking=False):
+        return None
+    if kind == 'cprofile':
+        profiler = cProfile.Profile()
+        profiler.enable()
+    else:
+        profiler = Sampler()
+        profiler.start()
+    return kind, profiler
+
+
+def _stop_profile(kind, profiler):
+    try:
+        if kind == 'cprofile':
+            profiler.disable()
+        else:
+            profiler.stop()
+    finally:
+        _profiling.release()
+
+
+def _profile_name(trace, kind):
+    return f'{trace.id}.{"prof" if kind == "cprofile" else "folded"}'
+
+
+def _save_profile(trace, kind, profiler, directory):
+    _stop_profile(kind, profiler)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / _profile_name(trace, kind)
+    if kind == 'cprofile':
+        profiler.dump_stats(path)
+    else:
+        profiler.save(path)
+    return path.name
+
+
+def register_instrumentation(app):
+    """Trace every request, serve `/metrics`, and profile requests that ask.
+
+    A request is profiled when the app runs with `profile_requests` on and
+    the request sends `X-Profile: cprofile` or `X-Profile: sample`; the
+    result is written under `<data_dir>/profiles/` and named in the
+    response's `X-Profile` header. Only one request is profiled at a time;
+    one that arrives meanwhile runs unprofiled with `X-Profile: busy`.
+
+    Streamed responses send their headers before the work is done, so they
+    get no `Server-Timing`; their request time is recorded, and their
+    profile saved, when the stream closes, and the endpoint reports
+    `current_trace().as_dict()` in its last row instead.
+
+    Stage timings are labelled by pipeline: 'analysis' for /analyze and
+    /ingest, otherwise the blueprint name (e.g. 'images' for thumbnails).
+    """
+    metrics = app.extensions['metrics'] = Metrics()
+    settings = app.config['SETTINGS']
+
+    @app.before_request
+    def start_trace():
+        incoming = request.headers.get('X-Trace-Id', '')
+        pipeline = PIPELINES.get(request.blueprint, request.blueprint or 'app')
+        trace = Trace(metrics, incoming if TRACE_ID_RE.match(incoming) else None, pipeline)
+        g.trace_token = _current.set(trace)
+        kind = request.headers.get('X-Profile', '').lower()
+        g.profile_wanted = settings.profile_requests and kind in PROFILERS
+        g.profile = _start_profile(kind) if g.profile_wanted else None
+
+    @app.after_request
+    def finish_trace(response):
+        trace = _current.get()
+        if trace is None:
+            return response
+        profile, g.profile = g.get('profile'), None
+        if profile:
+            response.headers['X-Profile'] = _profile_name(trace, profile[0])
+        elif g.get('profile_wanted'):
+            response.headers['X-Profile'] = 'busy'
+        labels = (request.endpoint or 'unknown', request.method, response.status_code)
+        response.headers['X-Trace-Id'] = trace.id
+        if response.is_streamed:
+            # The body has not run yet: profile and time it until the stream closes
+            def on_close():
+                if profile:
+                    _save_profile(trace, *profile, settings.profile_dir)
+                metrics.request_seconds.observe(time.perf_counter() - trace.started, *labels)
+            response.call_on_close(on_close)
+        else:
+            if profile:
+                _save_profile(trace, *profile, settings.profile_dir)
+            metrics.request_seconds.observe(time.perf_counter() - trace.started, *labels)
+            response.headers['Server-Timing'] = trace.server_timing()
+        return response
+
+    @app.teardown_request
+    def end_trace(error=None):
+        # A request that failed before after_request still frees the profiler
+        profile = g.pop('profile', None)
+        if profile:
+            _stop_profile(*profile)
+        token = g.pop('trace_token', None)
+        if token is not None:
+            _current.reset(token)
+
+    @app.get('/metrics')
+    def export_metrics():
+        return Response(current_app.extensions['metrics'].render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,212 @@
+"""Turning model replies into validated schema objects.
+
+Replies are validated straight from the JSON text by pydantic-core. When that
+fails the reply is repaired locally (fences, surrounding prose, trailing
+commas, Python-style literals, a reply cut off by max_tokens), and only if
+that fails too is the model asked, text only, to fix its own reply. Either
+way the image request is never re-sent.
+"""
+import ast
+import json
+import re
+import threading
+from dataclasses import dataclass
+
+from pydantic import ValidationError
+
+from .errors import AnalysisError
+from .instrumentation import stage
+from .schemas import REPLY
+
+FENCE_RE = re.compile(r'```(?:json)?\s*|\s*```', re.IGNORECASE)
+TRAILING_COMMA_RE = re.compile(r',\s*([}\]])')
+# A key, or a key and colon, left dangling at the end of a cut-off reply
+DANGLING_KEY_RE = re.compile(r',?\s*"[^"]*"\s*:?\s*$')
+PYTHON_LITERALS = {'null': 'None', 'true': 'True', 'false': 'False'}
+SMART_QUOTES = str.maketrans({'“': '"', '”': '"', '‘': "'", '’': "'"})
+
+REPAIR_PROMPT = (
+    'The reply below was meant to be a single JSON object matching this JSON schema, but it could '
+    'not be parsed. Respond ONLY with the corrected JSON object, keeping the values it contains and '
+    'using null for anything missing.\n\nSchema:\n{schema}\n\nReply:\n{reply}'
+)
+
+# Keywords strict structured outputs do not accept
+_UNSUPPORTED = {'default', 'title'}
+
+
+def _strict(schema):
+    if isinstance(schema, dict):
+        return {key: _strict(value) for key, value in schema.items() if key not in _UNSUPPORTED}
+    if isinstance(schema, list):
+        return [_strict(value) for value in schema]
+    return schema
+
+
+def json_schema(model):
+    """The model's fields as a strict JSON schema: every key required, nulls allowed."""
+    properties = _strict(model.model_json_schema()['properties'])
+    return {
+        'type': 'object',
+        'properties': properties,
+        'required': list(properties),
+        'additionalProperties': False,
+    }
+
+
+def response_format(model):
+    """`response_format` asking for structured output that matches `model`."""
+    return {
+        'type': 'json_schema',
+        'json_schema': {'name': model.__name__, 'strict': True, 'schema': json_schema(model)},
+    }
+
+
+def _close_truncated(text):
+    """Finish a JSON object that stops mid-way, as replies hitting max_tokens do."""
+    if (text.count('"') - text.count('\\"')) % 2:
+        text += '"'
+    # Drop a key whose value was lost entirely ("fat": )
+    text = DANGLING_KEY_RE.sub('', text.rstrip().rstrip(','))
+    return text + '}' * (text.count('{') - text.count('}'))
+
+
+def _readings(content):
+    """Increasingly forgiving versions of a reply, cheapest first."""
+    text = FENCE_RE.sub('', content or '').strip()
+    yield text
+    start, end = text.find('{'), text.rfind('}')
+    if start == -1:
+        return
+    body = text[start:end + 1] if end > start else text[start:]
+    body = TRAILING_COMMA_RE.sub(r'\1', body.translate(SMART_QUOTES))
+    yield body
+    if body.count('{') > body.count('}'):
+        yield _close_truncated(body)
+
+
+def _python_literal(text):
+    # {'name': 'Oats', 'sugar': None} - a Python dict rather than JSON
+    text = re.sub(r'\b(null|true|false)\b', lambda match: PYTHON_LITERALS[match.group()], text)
+    try:
+        value = ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return None
+    return value if isinstance(value, dict) else None
+
+
+def _is_object(content):
+    """Whether any reading of `content` is an object, i.e. it parsed but did not validate."""
+    for text in _readings(content):
+        try:
+            if isinstance(json.loads(text), dict):
+                return True
+        except ValueError:
+            pass
+        if _python_literal(text) is not None:
+            return True
+    return False
+
+
+def parse_locally(content, model):
+    """Return `(instance, repaired)`, or `(None, None)` if no reading validates.
+
+    A reply that parses but carries nothing usable does not validate.
+    """
+    readings = list(dict.fromkeys(_readings(content)))
+    for attempt, text in enumerate(readings):
+        try:
+            return model.model_validate_json(text, context=REPLY), attempt > 0
+        except ValidationError:
+            continue
+    for text in readings:
+        value = _python_literal(text)
+        if value is not None:
+            try:
+                return model.model_validate(value, context=REPLY), True
+            except ValidationError:
+                continue
+    return None, None
+
+
+@dataclass
+class ParseStats:
+    replies: int = 0
+    clean: int = 0
+    repaired_locally: int = 0
+    repaired_by_model: int = 0
+    failed: int = 0
+    # Tokens spent on text-only repair calls
+    repair_tokens: int = 0
+    # Tokens the image requests would have cost again had each bad reply
+    # been retried, less what the repairs cost
+    tokens_saved: int = 0
+
+    @property
+    def failure_rate(self):
+        """Share of replies that did not validate as sent."""
+        return (self.replies - self.clean) / self.replies if self.replies else 0.0
+
+    def as_dict(self):
+        return {
+            'replies': self.replies,
+            'clean': self.clean,
+            'repaired_locally': self.repaired_locally,
+            'repaired_by_model': self.repaired_by_model,
+            'failed': self.failed,
+            'failure_rate': round(self.failure_rate, 4),
+            'repair_tokens': self.repair_tokens,
+            'tokens_saved': self.tokens_saved,
+        }
+
+
+class ResponseParser:
+    """Validates replies against a schema model, repairing them rather than re-asking."""
+
+    def __init__(self):
+        self.stats = ParseStats()
+        self._lock = threading.Lock()
+
+    def _count(self, **changes):
+        with self._lock:
+            for name, value in changes.items():
+                setattr(self.stats, name, getattr(self.stats, name) + value)
+
+    def parse(self, content, model, repair=None, request_tokens=0):
+        """Validate `content` as `model`.
+
+        `repair(content, model)`, if given, makes the text-only repair call
+        and returns `(content, tokens)`. `request_tokens` is what the original
+        image request cost, i.e. what re-sending it would have cost.
+        """
+        with stage('parse'):
+            result, repaired = parse_locally(content, model)
+        if result is not None:
+            if repaired:
+                self._count(replies=1, repaired_locally=1, tokens_saved=request_tokens)
+            else:
+                self._count(replies=1, clean=1)
+            return result
+
+        if repair is not None:
+            try:
+                fixed, tokens = repair(content, model)
+            except AnalysisError:
+                self._count(replies=1, failed=1)
+                raise
+            with stage('parse'):
+                result, _ = parse_locally(fixed, model)
+            if result is not None:
+                self._count(replies=1, repaired_by_model=1, repair_tokens=tokens,
+                            tokens_saved=request_tokens - tokens)
+                return result
+        self._count(replies=1, failed=1)
+        if _is_object(content):
+            raise AnalysisError(f'Model reply had no usable {model.__name__}. Raw response: {content}')
+        raise AnalysisError(f'Failed to parse response as JSON. Raw response: {content}')
+
+
+def repair_prompt(content, model):
+    schema = json.dumps(json_schema(model), separators=(',', ':'))
+    # A runaway reply is not worth sending back in full
+    return REPAIR_PROMPT.format(schema=schema, reply=(content or '')[:4000])
@@ -0,0 +1,105 @@
+import base64
+import io
+from dataclasses import dataclass, replace
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .errors import APIError
+from .images import open_image
+from .instrumentation import stage
+
+FORMATS = {
+    'jpeg': ('JPEG', 'image/jpeg'),
+    'webp': ('WEBP', 'image/webp'),
+}
+
+
+@dataclass(frozen=True)
+class Profile:
+    # Longest side after downscaling
+    max_side: int
+    # Passed through as the image_url `detail` so the model bills accordingly
+    detail: str
+    grayscale: bool = False
+    quality: int = 82
+
+
+# Product shots only need to be recognisable; labels need legible small print
+PROFILES = {
+    'product': Profile(max_side=512, detail='low'),
+    'nutrition': Profile(max_side=1536, detail='high', grayscale=True, quality=85),
+}
+
+
+@dataclass
+class PreparedImage:
+    image: Image.Image
+    data: bytes
+    mime: str
+    detail: str
+    source_bytes: int
+
+    @property
+    def data_url(self):
+        return f'data:{self.mime};base64,{base64.b64encode(self.data).decode("ascii")}'
+
+
+def profile_for(task, settings=None):
+    profile = PROFILES[task]
+    max_side = getattr(settings, f'{task}_max_side', 0)
+    if not max_side or max_side == profile.max_side:
+        return profile
+    return replace(profile, max_side=max_side)
+
+
+def _size_of(stream):
+    position = stream.tell()
+    stream.seek(0, io.SEEK_END)
+    size = stream.tell()
+    stream.seek(position)
+    return size
+
+
+def prepare(stream, profile, fmt='jpeg'):
+    """Decode, orient, shrink and re-encode an upload for the vision model.
+
+    `stream` is any seekable binary file, e.g. the spooled upload werkzeug
+    hands us, so the original bytes are never copied into memory. For JPEGs
+    the decoder is asked for a reduced-scale draft, which means the full
+    camera-resolution bitmap is never materialised either.
+    """
+    source_bytes = _size_of(stream)
+    with stage('decode'):
+        try:
+            image = Image.open(stream)
+            if image.format == 'JPEG':
+                # Picks the largest DCT scale (1/2, 1/4, 1/8) that stays >= max_side
+                image.draft('L' if profile.grayscale else 'RGB', (profile.max_side, profile.max_side))
+            image.load()
+            ImageOps.exif_transpose(image, in_place=True)
+        except (UnidentifiedImageError, OSError) as error:
+            raise APIError(f'Could not decode image: {error}') from error
+
+    with stage('preprocess'):
+        image.thumbnail((profile.max_side, profile.max_side), Image.Resampling.LANCZOS)
+        if profile.grayscale:
+            # Stretch faded or badly lit labels to the full range before OCR-ish reading
+            image = ImageOps.autocontrast(image.convert('L'), cutoff=1)
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        pil_format, mime = FORMATS[fmt]
+        buffer = io.BytesIO()
+        if pil_format == 'JPEG':
+            image.save(buffer, pil_format, quality=profile.quality, optimize=True, progressive=True)
+        else:
+            image.save(buffer, pil_format, quality=profile.quality, method=4)
+    return PreparedImage(image, buffer.getvalue(), mime, profile.detail, source_bytes)
+
+
+def passthrough(stream, mime='image/jpeg'):
+    """Send the upload as-is; used when preprocessing is switched off."""
+    data = stream.read()
+    with stage('decode'):
+        image = open_image(data)
+    return PreparedImage(image, data, mime, 'auto', len(data))
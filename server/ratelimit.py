@@ -0,0 +1,74 @@
+import random
+import threading
+import time
+
+from .errors import RateLimitedError
+
+
+class TokenBucket:
+    """Thread-safe token bucket. `acquire` blocks until a request may go out."""
+
+    def __init__(self, rate, burst, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Reserve the token now and wait outside the lock, so callers queue
+            # up in arrival order instead of all re-checking at once
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            self._sleep(wait)
+        return wait
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def bucket_for(api_key, rate, burst):
+    """One bucket per API key so every app and worker shares the provider limit."""
+    with _buckets_lock:
+        bucket = _buckets.get(api_key)
+        if bucket is None or (bucket.rate, bucket.burst) != (rate, burst):
+            bucket = _buckets[api_key] = TokenBucket(rate, burst)
+        return bucket
+
+
+class RateLimiter:
+    """The shared bucket and 429 retry/backoff, applied to one model request.
+
+    It wraps each request rather than a whole analysis, so a rate-limited
+    text-only repair waits and retries itself instead of the image request
+    it was repairing being sent again.
+    """
+
+    def __init__(self, bucket=None, max_retries=4, backoff=0.5, sleep=time.sleep):
+        self.bucket = bucket
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.retries = 0
+        self._sleep = sleep
+
+    def call(self, request, *args, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            if self.bucket is not None:
+                self.bucket.acquire()
+            try:
+                return request(*args, **kwargs)
+            except RateLimitedError as error:
+                if attempt == self.max_retries:
+                    raise
+                self.retries += 1
+                # Honour Retry-After when given, otherwise exponential with full jitter
+                delay = error.retry_after or random.uniform(0, self.backoff * 2 ** attempt)
+                self._sleep(delay)
@@ -0,0 +1,209 @@
+import re
+
+from pydantic import BaseModel, ConfigDict, ValidationInfo, computed_field, field_validator, model_validator
+
+NUTRIENTS = ('calories', 'protein', 'carbohydrates', 'fat', 'sugar')
+
+# Validation context for model replies, as opposed to data the app itself sends
+REPLY = {'reply': True}
+
+AMOUNT_RE = re.compile(
+    r'(?P<number>-?\d+(?:[.,]\d+)*)\s*'
+    r'(?P<unit>kcal|kj|cal|milligrams?|mg|mcg|\u00b5g|ug|grams?|gr|g|oz|lbs?|kg)?\b',
+    re.IGNORECASE,
+)
+
+# Grams per unit for masses; energy is kept in kcal
+GRAMS = {'g': 1, 'gr': 1, 'gram': 1, 'grams': 1, 'mg': 0.001, 'milligram': 0.001, 'milligrams': 0.001, 'mcg': 1e-6, '\u00b5g': 1e-6, 'ug': 1e-6, 'kg': 1000,
+         'oz': 28.3495, 'lb': 453.592, 'lbs': 453.592}
+KJ_PER_KCAL = 4.184
+
+# Spellings models (and labels) use for our fields, compared lower-case with
+# anything but letters removed
+KEY_ALIASES = {
+    'productname': 'name', 'product': 'name', 'title': 'name',
+    'serving': 'servingSize', 'servingsize': 'servingSize', 'portion': 'servingSize',
+    'energy': 'calories', 'kcal': 'calories', 'calories': 'calories',
+    'proteins': 'protein', 'protein': 'protein',
+    'carbs': 'carbohydrates', 'carbohydrate': 'carbohydrates', 'totalcarbohydrate': 'carbohydrates',
+    'totalcarbohydrates': 'carbohydrates', 'carbohydrates': 'carbohydrates',
+    'totalfat': 'fat', 'fats': 'fat', 'fat': 'fat',
+    'sugars': 'sugar', 'totalsugars': 'sugar', 'sugar': 'sugar',
+    'upc': 'barcode', 'ean': 'barcode', 'gtin': 'barcode',
+}
+
+
+def _number(text):
+    # "1,200" is a thousands separator; "0,5" is a decimal comma
+    head, _, tail = text.rpartition(',')
+    if head and '.' not in text and len(tail) != 3:
+        return float(f'{head.replace(",", "")}.{tail}')
+    return float(text.replace(',', ''))
+
+
+def to_amount(value, nutrient):
+    """Read a nutrient amount in kcal (calories) or grams (everything else).
+
+    "12g" -> 12, "450 mg" -> 0.45, "840 kJ / 200 kcal" -> 200, "0,5 g" -> 0.5
+    """
+    if value is None or isinstance(value, (int, float)):
+        return value
+    amounts = [(_number(match['number']), (match['unit'] or '').lower()) for match in AMOUNT_RE.finditer(str(value))]
+    if not amounts:
+        return None
+    if nutrient == 'calories':
+        for amount, unit in amounts:
+            if unit in ('kcal', 'cal'):
+                return amount
+        amount, unit = amounts[0]
+        return round(amount / KJ_PER_KCAL, 1) if unit == 'kj' else amount
+    amount, unit = amounts[0]
+    return round(amount * GRAMS[unit], 4) if unit in GRAMS else amount
+
+
+def serving_grams(serving_size):
+    """Grams in a serving: "2.0 oz (56g)" -> 56, "1 oz" -> 28.3; None for volumes."""
+    if not serving_size:
+        return None
+    amounts = [(_number(match['number']), (match['unit'] or '').lower()) for match in AMOUNT_RE.finditer(serving_size)]
+    # Prefer the metric figure labels print in brackets
+    for amount, unit in amounts:
+        if unit == 'g':
+            return amount
+    for amount, unit in amounts:
+        if unit in GRAMS and not re.search(r'fl\.?\s*oz', serving_size, re.IGNORECASE):
+            return round(amount * GRAMS[unit], 1)
+    return None
+
+
+def to_text(value):
+    """Keep a text field that came back as a number: 12345678905 -> "12345678905"."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return value
+    return str(int(value)) if float(value).is_integer() else str(value)
+
+
+def _is_reply(info):
+    return bool(info.context and info.context.get('reply'))
+
+
+class Reply(BaseModel):
+    """Base for anything read from a model reply: unknown keys are ignored,
+    common alternative key spellings are accepted, and objects nested in the
+    reply ({"nutrition": {...}}) are merged into it.
+
+    Validated with `context=REPLY`, a product reply that names no product (a
+    refusal such as {"error": "..."}, or {}) is rejected rather than read as
+    all nulls. Label replies are not: an unreadable label is an answer, and
+    AnalysisService keeps empty results out of the cache.
+    """
+
+    model_config = ConfigDict(extra='ignore')
+
+    @model_validator(mode='before')
+    @classmethod
+    def normalise_keys(cls, data):
+        if not isinstance(data, dict) or data.keys() <= cls.model_fields.keys():
+            return data
+        # Merge nested objects into the top level; keys already there win
+        flat = {key: value for key, value in data.items() if not isinstance(value, dict)}
+        for value in data.values():
+            if isinstance(value, dict):
+                for key, inner in value.items():
+                    flat.setdefault(key, inner)
+        normalised = {}
+        for key, value in flat.items():
+            field = KEY_ALIASES.get(re.sub(r'[^a-z]', '', str(key).lower()), key)
+            # An exact key wins over an alias for the same field
+            if field not in normalised or field == key:
+                normalised[field] = value
+        return normalised
+
+
+class ProductInfo(Reply):
+    name: str | None = None
+    description: str | None = None
+    # UPC/EAN digits when the model could read them off the pack
+    barcode: str | None = None
+
+    @field_validator('name', 'description', 'barcode', mode='before')
+    @classmethod
+    def numbers_as_text(cls, value):
+        return to_text(value)
+
+    def has_content(self):
+        return bool((self.name or '').strip())
+
+    @model_validator(mode='after')
+    def require_content(self, info: ValidationInfo):
+        if _is_reply(info) and not self.has_content():
+            raise ValueError('reply has nothing usable in it')
+        return self
+
+
+class NutritionInfo(Reply):
+    servingSize: str | None = None
+    calories: float | None = None
+    protein: float | None = None
+    carbohydrates: float | None = None
+    fat: float | None = None
+    sugar: float | None = None
+
+    @field_validator(*NUTRIENTS, mode='before')
+    @classmethod
+    def strip_units(cls, value, info):
+        return to_amount(value, info.field_name)
+
+    @field_validator('servingSize', mode='before')
+    @classmethod
+    def serving_as_text(cls, value):
+        return to_text(value)
+
+    @computed_field
+    @property
+    def servingGrams(self) -> float | None:
+        return serving_grams(self.servingSize)
+
+
+class ItemAnalysis(ProductInfo, NutritionInfo):
+    """Everything the add-item dialog fills in, from one or two photos."""
+
+    def has_content(self):
+        # A good product with an unreadable label (or the reverse) still counts
+        return super().has_content() or any(getattr(self, nutrient) is not None for nutrient in NUTRIENTS)
+
+    def product(self):
+        return self.model_dump(include=set(ProductInfo.model_fields))
+
+    def nutrition(self):
+        return self.model_dump(include={*NutritionInfo.model_fields, 'servingGrams'})
+
+
+class ItemFields(BaseModel):
+    """A saved list item as the client sends it; unset fields are left alone on update."""
+
+    model_config = ConfigDict(extra='ignore')
+
+    name: str | None = None
+    description: str | None = None
+    barcode: str | None = None
+    price: float | None = None
+    quantity: int | None = None
+    nutritionInfo: NutritionInfo | None = None
+    category: str | None = None
+    # Unix time; defaults to when the item is added
+    purchasedAt: float | None = None
+    # sha256 references into the blob store
+    productImage: str | None = None
+    labelImage: str | None = None
+
+
+class CatalogueFields(BaseModel):
+    """A product added to the catalogue by hand rather than from a photo."""
+
+    model_config = ConfigDict(extra='ignore')
+
+    name: str
+    description: str | None = None
+    barcode: str | None = None
+    nutritionInfo: NutritionInfo | None = None
@@ -0,0 +1,273 @@
+import hashlib
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from . import aggregates
+from .errors import APIError
+from .instrumentation import stage
+from .schemas import NUTRIENTS
+
+HASH_RE = re.compile(r'^[0-9a-f]{64}$')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS lists (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS lists_name ON lists (name);
+
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    list_id INTEGER NOT NULL REFERENCES lists (id) ON DELETE CASCADE,
+    name TEXT,
+    description TEXT,
+    barcode TEXT,
+    price REAL NOT NULL DEFAULT 0,
+    quantity INTEGER NOT NULL DEFAULT 1,
+    serving_size TEXT,
+    calories REAL,
+    protein REAL,
+    carbohydrates REAL,
+    fat REAL,
+    sugar REAL,
+    product_image TEXT,
+    label_image TEXT,
+    category TEXT,
+    purchased_at REAL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS items_list ON items (list_id, id);
+"""
+
+# API field name -> column name, for everything that is not a nutrient
+ITEM_COLUMNS = {
+    'name': 'name',
+    'description': 'description',
+    'barcode': 'barcode',
+    'price': 'price',
+    'quantity': 'quantity',
+    'productImage': 'product_image',
+    'labelImage': 'label_image',
+    'category': 'category',
+    'purchasedAt': 'purchased_at',
+}
+
+NUTRITION_COLUMNS = {'servingSize': 'serving_size', **{nutrient: nutrient for nutrient in NUTRIENTS}}
+
+# Columns added after the first release of the table
+MIGRATIONS = {'category': 'TEXT', 'purchased_at': 'REAL', 'barcode': 'TEXT'}
+
+
+class BlobStore:
+    """Content-addressed files: each image is written once, named by its sha256."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def path(self, digest):
+        if not HASH_RE.match(digest or ''):
+            raise APIError('Not an image hash', 404)
+        return self.root / digest[:2] / digest
+
+    def exists(self, digest):
+        return self.path(digest).exists()
+
+    def put(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if not path.exists():
+            with stage('persist'):
+                path.parent.mkdir(exist_ok=True)
+                # Write then rename so readers never see a half-written blob
+                fd, tmp = tempfile.mkstemp(dir=path.parent)
+                with os.fdopen(fd, 'wb') as handle:
+                    handle.write(data)
+                os.replace(tmp, path)
+        return digest
+
+
+class ListStore:
+    """Saved grocery lists and their items as rows in SQLite (WAL mode).
+
+    Every change touches only the rows involved, so saving or loading one list
+    costs the same however many other lists exist.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        if self.path != ':memory:':
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self.connection() as db:
+            db.executescript(SCHEMA)
+            self._migrate(db)
+            db.executescript(aggregates.SCHEMA)
+            lists = db.execute('SELECT COUNT(*) FROM lists').fetchone()[0]
+            if db.execute('SELECT COUNT(*) FROM list_totals').fetchone()[0] != lists:
+                aggregates.rebuild(db)
+
+    @staticmethod
+    def _migrate(db):
+        existing = {row['name'] for row in db.execute('PRAGMA table_info(items)')}
+        for column, kind in MIGRATIONS.items():
+            if column not in existing:
+                db.execute(f'ALTER TABLE items ADD COLUMN {column} {kind}')
+
+    def connection(self):
+        # One connection per thread; WAL lets readers proceed during a write
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10)
+            db.row_factory = sqlite3.Row
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.execute('PRAGMA foreign_keys=ON')
+            self._local.db = db
+        return db
+
+    # Lists
+
+    def summaries(self, list_id=None):
+        """Every list (or just `list_id`) with its item count, read from the running totals."""
+        query = (
+            'SELECT lists.id, lists.name, lists.updated_at, list_totals.item_count '
+            'FROM lists JOIN list_totals ON list_totals.list_id = lists.id'
+        )
+        if list_id is None:
+            rows = self.connection().execute(query + ' ORDER BY lists.name').fetchall()
+        else:
+            rows = self.connection().execute(query + ' WHERE lists.id = ?', (list_id,)).fetchall()
+        return [
+            {'id': row['id'], 'name': row['name'], 'itemCount': row['item_count'], 'updatedAt': row['updated_at']}
+            for row in rows
+        ]
+
+    def find(self, name):
+        row = self.connection().execute('SELECT id FROM lists WHERE name = ?', (name,)).fetchone()
+        return row['id'] if row else None
+
+    def create_list(self, name):
+        now = time.time()
+        try:
+            with self.connection() as db:
+                cursor = db.execute(
+                    'INSERT INTO lists (name, created_at, updated_at) VALUES (?, ?, ?)', (name, now, now)
+                )
+                db.execute('INSERT INTO list_totals (list_id) VALUES (?)', (cursor.lastrowid,))
+        except sqlite3.IntegrityError as error:
+            raise APIError(f"A list named '{name}' already exists", 409) from error
+        return cursor.lastrowid
+
+    def get_list(self, list_id):
+        db = self.connection()
+        row = db.execute('SELECT id, name, updated_at FROM lists WHERE id = ?', (list_id,)).fetchone()
+        if row is None:
+            raise APIError('List not found', 404)
+        items = db.execute('SELECT * FROM items WHERE list_id = ? ORDER BY id', (list_id,)).fetchall()
+        return {
+            'id': row['id'],
+            'name': row['name'],
+            'updatedAt': row['updated_at'],
+            'items': [self._item_dict(item) for item in items],
+        }
+
+    def rename_list(self, list_id, name):
+        try:
+            with self.connection() as db:
+                cursor = db.execute(
+                    'UPDATE lists SET name = ?, updated_at = ? WHERE id = ?', (name, time.time(), list_id)
+                )
+        except sqlite3.IntegrityError as error:
+            raise APIError(f"A list named '{name}' already exists", 409) from error
+        if cursor.rowcount == 0:
+            raise APIError('List not found', 404)
+
+    def totals(self, list_id):
+        totals = aggregates.list_totals(self.connection(), list_id)
+        if totals is None:
+            raise APIError('List not found', 404)
+        return totals
+
+    def delete_list(self, list_id):
+        with self.connection() as db:
+            for row in db.execute('SELECT * FROM items WHERE list_id = ?', (list_id,)).fetchall():
+                aggregates.apply(db, row, -1)
+            cursor = db.execute('DELETE FROM lists WHERE id = ?', (list_id,))
+        if cursor.rowcount == 0:
+            raise APIError('List not found', 404)
+
+    # Items
+
+    def add_item(self, list_id, fields):
+        columns = self._columns(fields)
+        columns['created_at'] = time.time()
+        if not columns.get('purchased_at'):
+            columns['purchased_at'] = columns['created_at']
+        columns['list_id'] = list_id
+        names = ', '.join(columns)
+        marks = ', '.join('?' for _ in columns)
+        with stage('persist'), self.connection() as db:
+            self._touch(db, list_id)
+            cursor = db.execute(f'INSERT INTO items ({names}) VALUES ({marks})', tuple(columns.values()))
+            row = db.execute('SELECT * FROM items WHERE id = ?', (cursor.lastrowid,)).fetchone()
+            aggregates.apply(db, row, 1)
+        return self._item_dict(row)
+
+    def update_item(self, list_id, item_id, fields):
+        columns = self._columns(fields)
+        with stage('persist'), self.connection() as db:
+            self._touch(db, list_id)
+            old = db.execute('SELECT * FROM items WHERE id = ? AND list_id = ?', (item_id, list_id)).fetchone()
+            if old is None:
+                raise APIError('Item not found', 404)
+            if not columns:
+                return self._item_dict(old)
+            assignments = ', '.join(f'{column} = ?' for column in columns)
+            db.execute(f'UPDATE items SET {assignments} WHERE id = ?', (*columns.values(), item_id))
+            row = db.execute('SELECT * FROM items WHERE id = ?', (item_id,)).fetchone()
+            aggregates.apply(db, old, -1)
+            aggregates.apply(db, row, 1)
+        return self._item_dict(row)
+
+    def delete_item(self, list_id, item_id):
+        with stage('persist'), self.connection() as db:
+            self._touch(db, list_id)
+            row = db.execute('SELECT * FROM items WHERE id = ? AND list_id = ?', (item_id, list_id)).fetchone()
+            if row is None:
+                raise APIError('Item not found', 404)
+            aggregates.apply(db, row, -1)
+            db.execute('DELETE FROM items WHERE id = ?', (item_id,))
+
+    def _touch(self, db, list_id):
+        cursor = db.execute('UPDATE lists SET updated_at = ? WHERE id = ?', (time.time(), list_id))
+        if cursor.rowcount == 0:
+            raise APIError('List not found', 404)
+
+    @staticmethod
+    def _columns(fields):
+        columns = {
+            ITEM_COLUMNS[key]: value for key, value in fields.items()
+            # price and quantity are NOT NULL; a null just leaves them unchanged
+            if key in ITEM_COLUMNS and not (value is None and key in ('price', 'quantity'))
+        }
+        nutrition = fields.get('nutritionInfo')
+        if nutrition is not None:
+            columns.update({column: nutrition.get(key) for key, column in NUTRITION_COLUMNS.items()})
+        return columns
+
+    @staticmethod
+    def _item_dict(row):
+        nutrition = {key: row[column] for key, column in NUTRITION_COLUMNS.items()}
+        return {
+            'id': row['id'],
+            **{key: row[column] for key, column in ITEM_COLUMNS.items()},
+            'nutritionInfo': nutrition if any(value is not None for value in nutrition.values()) else None,
+        }
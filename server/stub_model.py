@@ -0,0 +1,141 @@
+"""OpenAI-compatible stand-in for the vision model, for offline benchmarks.
+
+Run it with `python -m server.stub_model --latency-ms 800` and point the API at
+it with `OPENAI_BASE_URL=http://127.0.0.1:5055/v1`.
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+
+from flask import Flask, jsonify, request
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+PRODUCTS = ['Rolled Oats', 'Greek Yogurt', 'Whole Milk', 'Peanut Butter', 'Brown Rice', 'Pasta Sauce']
+
+
+def _seed(image_url):
+    return int(hashlib.sha256(image_url.encode()).hexdigest()[:8], 16)
+
+
+def _reply_for(prompt, image_urls):
+    if not image_urls:
+        # Text-only repair request: answer with a well-formed reply of the
+        # schema it names
+        if '"servingSize"' not in prompt:
+            return _reply_for('product', [prompt])
+        if '"name"' not in prompt:
+            return _reply_for('nutrition label', [prompt])
+        return {**_reply_for('product', [prompt]), **_reply_for('nutrition label', [prompt])}
+    if len(image_urls) == 2:
+        # Combined request: product photo first, then its label
+        return {**_reply_for('product', image_urls[:1]), **_reply_for('nutrition label', image_urls[1:])}
+    seed = _seed(image_urls[0])
+    if 'nutrition label' in prompt:
+        return {
+            'servingSize': f'{seed % 4 + 1}.0 oz ({(seed % 4 + 1) * 28}g)',
+            'calories': 80 + seed % 300,
+            'protein': seed % 25,
+            'carbohydrates': seed % 60,
+            'fat': (seed % 40) / 2,
+            'sugar': seed % 20,
+        }
+    name = PRODUCTS[seed % len(PRODUCTS)]
+    return {'name': name, 'description': f'A package of {name.lower()}.'}
+
+
+def create_stub_app(latency=0.0, error_rate=0.0, seed=0):
+    """`error_rate` is the share of requests answered with a 429."""
+    app = Flask(__name__)
+    app.config['LATENCY'] = latency
+    app.config['ERROR_RATE'] = error_rate
+    app.config['CALLS'] = 0
+    app.config['RATE_LIMITED'] = 0
+    lock = threading.Lock()
+    rng = random.Random(seed)
+
+    @app.post('/v1/chat/completions')
+    def chat_completions():
+        body = request.get_json()
+        with lock:
+            app.config['CALLS'] += 1
+            limited = rng.random() < app.config['ERROR_RATE']
+            app.config['RATE_LIMITED'] += limited
+        if limited:
+            error = {'message': 'Rate limit reached (stub)', 'type': 'requests', 'code': 'rate_limit_exceeded'}
+            return jsonify({'error': error}), 429, {'retry-after': '0.05'}
+        time.sleep(app.config['LATENCY'])
+
+        parts = body['messages'][-1]['content']
+        prompt = ' '.join(p['text'] for p in parts if p['type'] == 'text')
+        image_urls = [p['image_url']['url'] for p in parts if p['type'] == 'image_url']
+        image_chars = sum(len(url) for url in image_urls)
+        content = json.dumps(_reply_for(prompt, image_urls))
+        return jsonify({
+            'id': 'chatcmpl-stub',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'gpt-4o'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop',
+            }],
+            # Rough stand-in for image token accounting
+            'usage': {
+                'prompt_tokens': 85 * len(image_urls) + image_chars // 1000,
+                'completion_tokens': len(content) // 4,
+                'total_tokens': 85 * len(image_urls) + image_chars // 1000 + len(content) // 4,
+            },
+        })
+
+    return app
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class StubServer:
+    """Run the stub on a background thread; use as a context manager."""
+
+    def __init__(self, latency=0.0, error_rate=0.0, host='127.0.0.1', port=0):
+        self.app = create_stub_app(latency, error_rate)
+        self._server = make_server(host, port, self.app, threaded=True, request_handler=_QuietHandler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f'http://{self._server.host}:{self._server.port}/v1'
+
+    @property
+    def calls(self):
+        return self.app.config['CALLS']
+
+    @property
+    def rate_limited(self):
+        return self.app.config['RATE_LIMITED']
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+    create_stub_app(args.latency_ms / 1000, args.error_rate).run(port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
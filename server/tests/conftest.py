@@ -0,0 +1,49 @@
+import pytest
+
+from server.app import create_app
+from server.config import Settings
+from server.bench.fixtures import make_photo
+from server.schemas import ItemAnalysis
+
+
+PRODUCT = {'name': 'Rolled Oats', 'description': 'A bag of oats.'}
+NUTRITION = {'servingSize': '40g', 'calories': 150.0, 'protein': 5.0,
+             'carbohydrates': 27.0, 'fat': 3.0, 'sugar': 1.0}
+
+
+class FakeVisionClient:
+    def __init__(self):
+        self.calls = []
+
+    def analyze(self, task, data_url, detail='auto'):
+        self.calls.append(task)
+        return dict(PRODUCT if task == 'product' else NUTRITION)
+
+    def analyze_item(self, product, nutrition):
+        self.calls.append('item')
+        return ItemAnalysis(**PRODUCT, **NUTRITION)
+
+
+@pytest.fixture
+def settings(tmp_path):
+    return Settings(openai_api_key='test', data_dir=tmp_path)
+
+
+@pytest.fixture
+def vision():
+    return FakeVisionClient()
+
+
+@pytest.fixture
+def app(settings, vision):
+    return create_app(settings, client=vision)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def photo():
+    return make_photo(1, size=(400, 300))
@@ -0,0 +1,67 @@
+from datetime import datetime, timezone
+
+from server import aggregates
+
+MONDAY = datetime(2026, 9, 7, tzinfo=timezone.utc).timestamp()
+WEEK = 7 * 24 * 3600
+
+
+def add(client, list_id, **item):
+    return client.post(f'/lists/{list_id}/items', json=item).get_json()
+
+
+def snapshot(db):
+    return {table: [tuple(row) for row in db.execute(f'SELECT * FROM {table} ORDER BY 1')]
+            for table in ('list_totals', *aggregates.ROLLUPS)}
+
+
+def test_list_totals_follow_add_edit_delete(client):
+    list_id = client.post('/lists', json={'name': 'Shop'}).get_json()['id']
+    oats = add(client, list_id, name='Oats', price=2.99, quantity=2,
+               nutritionInfo={'calories': 150, 'protein': 5, 'carbohydrates': 27, 'fat': 3, 'sugar': 1})
+    add(client, list_id, name='Milk', price=1.10, quantity=1, nutritionInfo={'calories': 120, 'protein': 8})
+
+    totals = client.get(f'/lists/{list_id}/totals').get_json()
+    assert (totals['spend'], totals['quantity'], totals['calories'], totals['protein']) == (7.08, 3, 420, 18)
+
+    client.patch(f'/lists/{list_id}/items/{oats["id"]}', json={'quantity': 1})
+    assert client.get(f'/lists/{list_id}/totals').get_json()['spend'] == 4.09
+
+    client.delete(f'/lists/{list_id}/items/{oats["id"]}')
+    totals = client.get(f'/lists/{list_id}/totals').get_json()
+    assert (totals['itemCount'], totals['spend'], totals['carbohydrates']) == (1, 1.1, 0)
+
+
+def test_history_rollups_match_a_full_rebuild(client, app):
+    first = client.post('/lists', json={'name': 'Week 1'}).get_json()['id']
+    second = client.post('/lists', json={'name': 'Week 2'}).get_json()['id']
+    add(client, first, name='Oats', price=3, quantity=1, category='Pantry', purchasedAt=MONDAY)
+    add(client, first, name='Apples', price=4, quantity=2, category='Produce', purchasedAt=MONDAY + 3600)
+    pears = add(client, second, name='Pears', price=5, quantity=1, category='Produce', purchasedAt=MONDAY + WEEK)
+    add(client, second, name='oats', price=3, quantity=2, category='Pantry', purchasedAt=MONDAY + WEEK)
+    client.patch(f'/lists/{second}/items/{pears["id"]}', json={'price': 6})
+
+    assert client.get('/analytics/weekly').get_json() == [
+        {'week': '2026-09-07', 'itemCount': 2, 'quantity': 3, 'spend': 11.0,
+         'calories': 0, 'protein': 0, 'carbohydrates': 0, 'fat': 0, 'sugar': 0},
+        {'week': '2026-09-14', 'itemCount': 2, 'quantity': 3, 'spend': 12.0,
+         'calories': 0, 'protein': 0, 'carbohydrates': 0, 'fat': 0, 'sugar': 0},
+    ]
+    assert [(c['category'], c['spend']) for c in client.get('/analytics/categories').get_json()] == [
+        ('Produce', 14.0), ('Pantry', 9.0),
+    ]
+    top = client.get('/analytics/top-items?by=quantity&limit=2').get_json()
+    assert [(item['name'], item['quantity']) for item in top] == [('oats', 3), ('Apples', 2)]
+
+    client.delete(f'/lists/{first}')
+    db = app.extensions['lists'].connection()
+    incremental = snapshot(db)
+    with db:
+        aggregates.rebuild(db)
+    assert snapshot(db) == incremental
+    assert [week['week'] for week in client.get('/analytics/weekly').get_json()] == ['2026-09-14']
+
+
+def test_bad_analytics_arguments(client):
+    assert client.get('/analytics/top-items?by=colour').status_code == 400
+    assert client.get('/analytics/weekly?weeks=many').status_code == 400
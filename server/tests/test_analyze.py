@@ -0,0 +1,136 @@
+import base64
+import hashlib
+import io
+
+import pytest
+
+from server.bench.fixtures import make_photo, reshoot
+from server.cache import ResultCache
+from server.config import Settings
+from server.images import fingerprint, open_image
+from server.stub_model import StubServer
+from server.vision import VisionClient
+
+
+def data_url(raw):
+    return 'data:image/jpeg;base64,' + base64.b64encode(raw).decode('ascii')
+
+
+def test_repeat_scan_is_served_from_cache(client, vision, photo):
+    first = client.post('/analyze/product', json={'image': data_url(photo)})
+    second = client.post('/analyze/product', json={'image': data_url(photo)})
+
+    assert first.headers['X-Cache'] == 'miss'
+    assert second.headers['X-Cache'] == 'hit'
+    assert second.get_json() == first.get_json()
+    assert vision.calls == ['product']
+
+
+def test_multipart_upload_shares_cache_with_data_url(client, vision, photo):
+    client.post('/analyze/nutrition', json={'image': data_url(photo)})
+    response = client.post('/analyze/nutrition', data={'image': (io.BytesIO(photo), 'label.jpg')})
+
+    assert response.headers['X-Cache'] == 'hit'
+    assert response.get_json()['calories'] == 150.0
+    assert vision.calls == ['nutrition']
+
+
+def test_identical_upload_is_answered_without_decoding(app, client, vision, photo, monkeypatch):
+    client.post('/analyze/product', data={'image': (io.BytesIO(photo), 'p.jpg')})
+    service = app.extensions['analysis']
+    monkeypatch.setattr(service, 'prepare', lambda *args: pytest.fail('decoded a cached upload'))
+
+    response = client.post('/analyze/product', data={'image': (io.BytesIO(photo), 'p.jpg')})
+    assert response.headers['X-Cache'] == 'hit'
+    assert vision.calls == ['product']
+
+
+def test_same_pixels_in_new_bytes_are_linked_to_the_entry(app, client, vision):
+    image = open_image(make_photo(5, size=(400, 300)))
+    fast, small = io.BytesIO(), io.BytesIO()
+    image.save(fast, 'PNG', compress_level=1)
+    image.save(small, 'PNG', compress_level=9)
+    client.post('/analyze/nutrition', data={'image': (io.BytesIO(fast.getvalue()), 'l.png')})
+
+    assert client.post('/analyze/nutrition', data={'image': (io.BytesIO(small.getvalue()), 'l.png')}).headers['X-Cache'] == 'hit'
+    cache = app.extensions['analysis'].cache
+    assert cache.get_upload('nutrition', hashlib.sha256(small.getvalue()).hexdigest())[1] == 'hit'
+    assert vision.calls == ['nutrition']
+
+
+def test_empty_results_are_not_cached(client, vision, photo, monkeypatch):
+    monkeypatch.setattr(vision, 'analyze', lambda task, data_url, detail='auto': vision.calls.append(task) or {})
+    client.post('/analyze/product', data={'image': (io.BytesIO(photo), 'p.jpg')})
+
+    assert client.post('/analyze/product', data={'image': (io.BytesIO(photo), 'p.jpg')}).headers['X-Cache'] == 'miss'
+    assert vision.calls == ['product', 'product']
+
+
+def test_reshot_product_is_a_near_hit_but_label_is_not(client, vision, photo):
+    again = reshoot(photo, quality=75)
+    client.post('/analyze/product', json={'image': data_url(photo)})
+    client.post('/analyze/nutrition', json={'image': data_url(photo)})
+
+    assert client.post('/analyze/product', json={'image': data_url(again)}).headers['X-Cache'] == 'near'
+    assert client.post('/analyze/nutrition', json={'image': data_url(again)}).headers['X-Cache'] == 'miss'
+
+
+def test_different_products_do_not_collide(client, vision):
+    client.post('/analyze/product', json={'image': data_url(make_photo(1, size=(400, 300)))})
+    response = client.post('/analyze/product', json={'image': data_url(make_photo(2, size=(400, 300)))})
+
+    assert response.headers['X-Cache'] == 'miss'
+    assert len(vision.calls) == 2
+
+
+def test_invalid_image_is_a_400(client, vision):
+    response = client.post('/analyze/product', json={'image': 'data:image/png;base64,bm90IGFuIGltYWdl'})
+
+    assert response.status_code == 400
+    assert 'Could not decode image' in response.get_json()['error']
+    assert vision.calls == []
+
+
+def test_cache_is_bounded_and_survives_restart(tmp_path):
+    path = tmp_path / 'cache.sqlite3'
+    prints = [fingerprint(open_image(make_photo(seed, size=(64, 64)))) for seed in range(5)]
+    cache = ResultCache(path, max_entries=3)
+    for index, fp in enumerate(prints):
+        cache.put('product', fp, {'name': str(index)})
+
+    assert len(cache) == 3
+    # Evicted from memory but still on disk
+    assert cache.get('product', prints[0]) == ({'name': '0'}, 'hit')
+    assert cache.stats.disk_hits == 1
+    cache.close()
+
+    reopened = ResultCache(path, max_entries=3)
+    assert len(reopened) == 3
+    assert reopened.get('product', prints[4]) == ({'name': '4'}, 'hit')
+    assert reopened.stats.disk_hits == 0
+
+
+def test_memory_hits_keep_entries_warm_on_disk(tmp_path):
+    path = tmp_path / 'cache.sqlite3'
+    prints = [fingerprint(open_image(make_photo(seed, size=(64, 64)))) for seed in range(3)]
+    cache = ResultCache(path, max_entries=3)
+    for index, fp in enumerate(prints):
+        cache.put('product', fp, {'name': str(index)})
+    # Only ever served from memory, but still the most recently used
+    assert cache.get('product', prints[0]) == ({'name': '0'}, 'hit')
+    cache.close()
+
+    reopened = ResultCache(path, max_entries=1)
+    assert reopened.get('product', prints[0]) == ({'name': '0'}, 'hit')
+    assert reopened.stats.disk_hits == 0
+
+
+def test_vision_client_round_trip_through_stub(tmp_path, photo):
+    with StubServer() as stub:
+        vision = VisionClient(Settings(openai_api_key='stub', openai_base_url=stub.base_url))
+        product = vision.analyze('product', data_url(photo))
+        nutrition = vision.analyze('nutrition', data_url(photo))
+
+    assert set(product) == {'name', 'description', 'barcode'}
+    assert isinstance(nutrition['calories'], float)
+    assert stub.calls == 2
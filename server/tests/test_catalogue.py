@@ -0,0 +1,62 @@
+import io
+
+from server.catalogue import Catalogue, near_prefix, normalise_barcode, prefix_distance
+
+
+def names(results):
+    return [product['name'] for product in results]
+
+
+def test_analysed_products_are_recorded_and_merged(client, photo):
+    label = io.BytesIO(photo)
+    client.post('/analyze/item', data={'product': (io.BytesIO(photo), 'p.jpg'), 'nutrition': (label, 'l.jpg')})
+    client.post('/analyze/product', data={'image': (io.BytesIO(photo), 'p.jpg')})
+
+    [oats] = client.get('/catalogue/search?q=oat').get_json()
+    assert (oats['name'], oats['seen']) == ('Rolled Oats', 2)
+    assert oats['nutritionInfo']['calories'] == 150.0
+
+
+def test_search_tolerates_typos_and_partial_words(tmp_path):
+    catalogue = Catalogue(tmp_path / 'catalogue.sqlite3')
+    for name in ('Whole Milk 2L', 'Oat Milk', 'Cheddar Cheese', 'Mild Salsa', 'Wholemeal Bread'):
+        catalogue.record({'name': name})
+
+    assert names(catalogue.search('whle mil')) == ['Whole Milk 2L']
+    assert names(catalogue.search('chedar')) == ['Cheddar Cheese']
+    assert set(names(catalogue.search('mil'))) == {'Whole Milk 2L', 'Oat Milk', 'Mild Salsa'}
+    # A whole-word hit ranks above a prefix hit
+    assert names(catalogue.search('milk'))[0] in ('Whole Milk 2L', 'Oat Milk')
+    assert names(catalogue.search('whole'))[0] == 'Whole Milk 2L'
+    assert catalogue.search('xyz') == []
+
+    # The index is rebuilt from SQLite on restart
+    catalogue.close()
+    assert names(Catalogue(tmp_path / 'catalogue.sqlite3').search('salsa')) == ['Mild Salsa']
+
+
+def test_barcodes_normalise_and_move_between_products(client):
+    assert normalise_barcode('0 12345 67890 5') == '0012345678905'
+    assert normalise_barcode('012345678906') is None
+    assert normalise_barcode('96385074') == '96385074'
+
+    client.post('/catalogue', json={'name': 'Peanut Butter', 'barcode': '012345678905'})
+    assert client.get('/catalogue/barcode/0012345678905').get_json()['name'] == 'Peanut Butter'
+
+    client.post('/catalogue', json={'name': 'Almond Butter', 'barcode': '0012345678905'})
+    assert client.get('/catalogue/barcode/012345678905').get_json()['name'] == 'Almond Butter'
+    [peanut] = client.get('/catalogue/search?q=peanut').get_json()
+    assert peanut['barcode'] is None
+
+    assert client.get('/catalogue/barcode/12345').status_code == 400
+    assert client.get('/catalogue/barcode/96385074').status_code == 404
+    assert client.post('/catalogue', json={'name': 'X', 'barcode': '123'}).status_code == 400
+
+
+def test_edit_distance_to_a_prefix():
+    assert prefix_distance('chedar', 'cheddar', 2) == 1
+    assert prefix_distance('granloa', 'granola', 2) == 1
+    assert prefix_distance('bread', 'milk', 1) == 2
+    # The one-edit shortcut agrees with the DP
+    for token, word in [('whle', 'wholemeal'), ('mlik', 'milk'), ('bmilk', 'milk'), ('abcd', 'ab'), ('oast', 'oats')]:
+        assert near_prefix(token, word, 1) == (prefix_distance(token, word, 1) <= 1)
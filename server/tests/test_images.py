@@ -0,0 +1,49 @@
+import io
+
+import pytest
+from PIL import Image
+
+from server.bench.fixtures import make_photo
+
+
+@pytest.fixture
+def digest(client):
+    photo = make_photo(7, size=(1600, 1200))
+    return client.post('/images', data={'image': (io.BytesIO(photo), 'p.jpg')}).get_json()['hash']
+
+
+def test_thumbnails_are_rendered_once_at_fixed_sizes(client, app, digest):
+    card = client.get(f'/images/{digest}?size=card')
+    viewer = client.get(f'/images/{digest}?size=viewer')
+
+    assert max(Image.open(io.BytesIO(card.data)).size) == 280
+    assert max(Image.open(io.BytesIO(viewer.data)).size) == 1200
+    path = app.extensions['thumbnails'].path(digest, 'card')
+    mtime = path.stat().st_mtime_ns
+    client.get(f'/images/{digest}?size=card')
+    assert path.stat().st_mtime_ns == mtime
+
+
+def test_responses_are_immutable_with_strong_etags(client, digest):
+    response = client.get(f'/images/{digest}?size=card')
+
+    assert response.headers['ETag'] == f'"{digest}-card"'
+    assert 'immutable' in response.headers['Cache-Control']
+    assert 'max-age=31536000' in response.headers['Cache-Control']
+    again = client.get(f'/images/{digest}?size=card', headers={'If-None-Match': response.headers['ETag']})
+    assert again.status_code == 304 and again.data == b''
+
+
+def test_full_size_supports_range_requests(client, digest):
+    full = client.get(f'/images/{digest}').data
+    part = client.get(f'/images/{digest}', headers={'Range': 'bytes=0-1023'})
+
+    assert part.status_code == 206
+    assert part.data == full[:1024]
+    assert part.headers['Content-Range'] == f'bytes 0-1023/{len(full)}'
+
+
+def test_bad_size_and_missing_image(client, digest):
+    assert client.get(f'/images/{digest}?size=huge').status_code == 400
+    assert client.get(f'/images/{"0" * 64}?size=card').status_code == 404
+    assert client.get('/images/not-a-hash').status_code == 404
@@ -0,0 +1,106 @@
+import io
+import json
+import zipfile
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from server.bench.fixtures import make_photo
+from server.errors import APIError, RateLimitedError
+from server.ingest import Source, group_sources, upload_sources
+from server.ratelimit import RateLimiter, TokenBucket
+
+
+def rows(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def names(*names):
+    return [Source(name, None) for name in names]
+
+
+def test_labels_pair_with_products_by_name():
+    items = group_sources(names('milk.jpg', 'oats.png', 'milk-label.jpg', 'eggs/product.jpg',
+                                'eggs/label.jpg', 'notes.txt', '__MACOSX/._milk.jpg'))
+
+    assert [(item.key, sorted(item.sources)) for item in items] == [
+        ('milk', ['nutrition', 'product']),
+        ('oats', ['product']),
+        ('eggs', ['nutrition', 'product']),
+    ]
+
+
+def test_same_name_in_different_folders_is_two_items():
+    items = group_sources(names('week1/milk.jpg', 'week2/milk.jpg', 'week2/milk-label.jpg'))
+
+    assert [(item.key, sorted(item.sources)) for item in items] == [
+        ('week1/milk', ['product']),
+        ('week2/milk', ['nutrition', 'product']),
+    ]
+
+
+def test_unnamed_uploads_are_kept_apart():
+    uploads = [FileStorage(io.BytesIO(b''), filename='', name='files', content_type='image/png') for _ in range(2)]
+
+    assert [item.key for item in group_sources(upload_sources(uploads))] == ['upload0', 'upload1']
+
+
+def test_duplicate_photos_for_one_item_are_rejected():
+    with pytest.raises(APIError):
+        group_sources(names('milk.jpg', 'milk.png'))
+
+
+def test_batch_streams_one_row_per_item_then_a_summary(client, vision):
+    photos = {f'item{i}.jpg': make_photo(i, size=(200, 150)) for i in range(5)}
+    photos['item0_label.jpg'] = make_photo(99, size=(200, 150))
+    files = [(io.BytesIO(raw), name) for name, raw in photos.items()]
+    response = client.post('/ingest/batch', data={'files': files})
+
+    assert response.mimetype == 'application/x-ndjson'
+    lines = rows(response)
+    assert sorted(row['index'] for row in lines[:-1]) == list(range(5))
+    assert all(row['status'] == 'ok' for row in lines[:-1])
+    assert next(row for row in lines if row.get('key') == 'item0')['mode'] == 'combined'
+    assert lines[-1]['done'] and lines[-1]['items'] == 5 and lines[-1]['failed'] == 0
+
+
+def test_zip_archive_and_bad_photos(client):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w') as zf:
+        zf.writestr('cart/milk.jpg', make_photo(1, size=(200, 150)))
+        zf.writestr('cart/broken.jpg', b'not an image')
+    archive.seek(0)
+    response = client.post('/ingest/batch', data={'archive': (archive, 'cart.zip')},
+                           headers={'Accept': 'text/event-stream'})
+
+    assert response.mimetype == 'text/event-stream'
+    events = [json.loads(chunk[len('data: '):]) for chunk in response.get_data(as_text=True).split('\n\n') if chunk]
+    by_key = {row['key']: row for row in events if 'key' in row}
+    assert by_key['cart/milk']['status'] == 'ok'
+    assert by_key['cart/broken']['status'] == 'error'
+    assert events[-1]['failed'] == 1
+
+
+def test_rate_limited_calls_back_off_and_retry():
+    attempts = []
+
+    def flaky(task):
+        attempts.append(task)
+        if len(attempts) < 3:
+            raise RateLimitedError('429', retry_after=None if len(attempts) == 1 else 2.0)
+        return {'name': 'ok'}
+
+    delays = []
+    limiter = RateLimiter(max_retries=4, backoff=0.5, sleep=delays.append)
+
+    assert limiter.call(flaky, 'product') == {'name': 'ok'}
+    assert limiter.retries == 2
+    assert 0 <= delays[0] <= 0.5 and delays[1] == 2.0
+
+
+def test_token_bucket_spaces_requests_after_the_burst():
+    now = [0.0]
+    waits = []
+    bucket = TokenBucket(rate=4, burst=2, clock=lambda: now[0], sleep=waits.append)
+
+    assert [bucket.acquire() for _ in range(4)] == [0.0, 0.0, 0.25, 0.5]
@@ -0,0 +1,117 @@
+import dataclasses
+import io
+import json
+import pstats
+
+from server import instrumentation
+from server.app import create_app
+from server.bench.fixtures import make_photo
+from server.instrumentation import Histogram
+from server.stub_model import StubServer
+
+
+def timings(response):
+    return {part.split(';')[0].strip() for part in response.headers['Server-Timing'].split(',')}
+
+
+def test_every_stage_is_timed_and_exported(settings, photo):
+    label = make_photo(2, size=(400, 300))
+    with StubServer() as stub:
+        client = create_app(dataclasses.replace(settings, openai_base_url=stub.base_url)).test_client()
+        response = client.post(
+            '/analyze/item',
+            data={'product': (io.BytesIO(photo), 'p.jpg'), 'nutrition': (io.BytesIO(label), 'l.jpg')},
+            headers={'X-Trace-Id': 'add-item-1'},
+        )
+
+    assert response.headers['X-Trace-Id'] == 'add-item-1'
+    assert timings(response) >= {'decode', 'preprocess', 'cache', 'model', 'parse', 'persist', 'total', 'tokens', 'bytes'}
+    assert 'upload=' in response.headers['Server-Timing']
+
+    metrics = client.get('/metrics').get_data(as_text=True)
+    assert 'analysis_stage_seconds_count{pipeline="analysis",stage="model"} 1' in metrics
+    assert 'analysis_model_tokens_count{kind="prompt"} 1' in metrics
+    assert 'analysis_image_bytes_bucket{kind="upload",le="+Inf"} 2' in metrics
+    assert 'http_request_seconds_count{endpoint="analyze.analyze_item",method="POST",status="200"} 1' in metrics
+
+
+def test_streamed_batch_reports_its_trace_when_done(client):
+    files = [(io.BytesIO(make_photo(i, size=(200, 150))), f'item{i}.jpg') for i in range(3)]
+    response = client.post('/ingest/batch', data={'files': files}, headers={'X-Trace-Id': 'cart-1'})
+    summary = json.loads(response.get_data(as_text=True).splitlines()[-1])
+    response.close()
+
+    assert 'Server-Timing' not in response.headers
+    assert summary['trace']['id'] == response.headers['X-Trace-Id'] == 'cart-1'
+    assert {'decode', 'preprocess', 'cache', 'persist'} <= set(summary['trace']['stages_ms'])
+    assert summary['trace']['image_bytes']['upload'] > 0
+    # Recorded when the stream closed, so it covers the whole batch
+    metrics = client.get('/metrics').get_data(as_text=True)
+    count = 'http_request_seconds_count{endpoint="ingest.ingest_batch",method="POST",status="200"} 1'
+    assert count in metrics
+    total = next(line for line in metrics.splitlines() if line.startswith('http_request_seconds_sum{endpoint="ingest'))
+    assert float(total.split()[-1]) * 1000 >= summary['elapsed_ms']
+
+
+def test_thumbnail_work_is_kept_out_of_analysis_stages(client):
+    digest = client.post('/images', data={'image': (io.BytesIO(make_photo(3)), 'p.jpg')}).get_json()['hash']
+    client.get(f'/images/{digest}?size=card')
+
+    metrics = client.get('/metrics').get_data(as_text=True)
+    assert 'analysis_stage_seconds_count{pipeline="images",stage="preprocess"} 1' in metrics
+    assert 'pipeline="analysis"' not in metrics
+
+
+def test_streamed_batch_is_profiled_until_it_closes(settings, vision):
+    client = create_app(dataclasses.replace(settings, profile_requests=True), client=vision).test_client()
+    files = [(io.BytesIO(make_photo(i, size=(200, 150))), f'item{i}.jpg') for i in range(2)]
+    response = client.post('/ingest/batch', data={'files': files}, headers={'X-Profile': 'cprofile'})
+    path = settings.profile_dir / response.headers['X-Profile']
+    assert not path.exists()
+    response.get_data()
+    response.close()
+
+    stats = pstats.Stats(str(path))
+    assert any(name == 'generate' for _, _, name in stats.stats)
+    assert not instrumentation._profiling.locked()
+
+
+def test_trace_ids_are_generated_and_sanitised(client):
+    assert len(client.get('/health').headers['X-Trace-Id']) == 16
+    assert client.get('/health', headers={'X-Trace-Id': 'bad id; drop'}).headers['X-Trace-Id'] != 'bad id; drop'
+
+
+def test_profiling_is_opt_in(settings, vision, photo):
+    upload = {'image': (io.BytesIO(photo), 'p.jpg')}
+    client = create_app(settings, client=vision).test_client()
+    assert 'X-Profile' not in client.post('/analyze/product', data=upload, headers={'X-Profile': 'cprofile'}).headers
+
+    client = create_app(dataclasses.replace(settings, profile_requests=True), client=vision).test_client()
+    response = client.post('/analyze/product', data={'image': (io.BytesIO(photo), 'p.jpg')},
+                           headers={'X-Profile': 'cprofile'})
+    stats = pstats.Stats(str(settings.profile_dir / response.headers['X-Profile']))
+    assert any(name == 'analyze' for _, _, name in stats.stats)
+
+    response = client.post('/analyze/product', data={'image': (io.BytesIO(photo), 'p.jpg')},
+                           headers={'X-Profile': 'sample'})
+    assert response.headers['X-Profile'].endswith('.folded')
+
+    # A request arriving while another is profiled runs unprofiled
+    with instrumentation._profiling:
+        response = client.post('/analyze/product', data={'image': (io.BytesIO(photo), 'p.jpg')},
+                               headers={'X-Profile': 'cprofile'})
+    assert (response.status_code, response.headers['X-Profile']) == (200, 'busy')
+
+
+def test_histogram_rendering():
+    histogram = Histogram('demo_seconds', 'Demo.', (0.1, 1), ('stage',))
+    histogram.observe(0.05, 'model')
+    histogram.observe(0.5, 'model')
+
+    assert histogram.render().splitlines()[2:] == [
+        'demo_seconds_bucket{stage="model",le="0.1"} 1',
+        'demo_seconds_bucket{stage="model",le="1"} 2',
+        'demo_seconds_bucket{stage="model",le="+Inf"} 2',
+        'demo_seconds_sum{stage="model"} 0.55',
+        'demo_seconds_count{stage="model"} 2',
+    ]
@@ -0,0 +1,99 @@
+import dataclasses
+import io
+from types import SimpleNamespace
+
+from server.app import create_app
+from server.bench.fixtures import make_photo
+from server.config import Settings
+from server.schemas import NutritionInfo
+from server.stub_model import StubServer
+from server.vision import VisionClient
+
+
+def files(product=None, nutrition=None):
+    data = {}
+    if product:
+        data['product'] = (io.BytesIO(product), 'product.jpg')
+    if nutrition:
+        data['nutrition'] = (io.BytesIO(nutrition), 'label.jpg')
+    return data
+
+
+def test_both_photos_use_one_combined_call(client, vision, photo):
+    label = make_photo(2, size=(400, 300))
+    response = client.post('/analyze/item', data=files(photo, label))
+
+    assert response.headers['X-Analysis-Mode'] == 'combined'
+    assert response.headers['X-Cache'] == 'product=miss, nutrition=miss'
+    assert response.get_json()['name'] == 'Rolled Oats'
+    assert response.get_json()['calories'] == 150.0
+    assert vision.calls == ['item']
+
+    # The split results seed the single-image caches too
+    assert client.post('/analyze/product', data={'image': (io.BytesIO(photo), 'p.jpg')}).headers['X-Cache'] == 'hit'
+
+
+def test_concurrent_fallback_when_combined_is_off(settings, vision, photo):
+    settings = dataclasses.replace(settings, combined_analysis=False)
+    client = create_app(settings, client=vision).test_client()
+    response = client.post('/analyze/item', data=files(photo, make_photo(2, size=(400, 300))))
+
+    assert response.headers['X-Analysis-Mode'] == 'concurrent'
+    assert sorted(vision.calls) == ['nutrition', 'product']
+    assert response.get_json()['sugar'] == 1.0
+
+
+def test_only_the_uncached_photo_reaches_the_model(client, vision, photo):
+    label = make_photo(2, size=(400, 300))
+    client.post('/analyze/nutrition', data={'image': (io.BytesIO(label), 'l.jpg')})
+    response = client.post('/analyze/item', data=files(photo, label))
+
+    assert response.headers['X-Analysis-Mode'] == 'single'
+    assert response.headers['X-Cache'] == 'product=miss, nutrition=hit'
+    assert vision.calls == ['nutrition', 'product']
+
+
+def test_product_only_leaves_nutrition_empty(client, photo):
+    body = client.post('/analyze/item', data=files(product=photo)).get_json()
+
+    assert body['name'] == 'Rolled Oats'
+    assert body['calories'] is None
+
+
+def test_nutrition_units_are_stripped():
+    info = NutritionInfo.model_validate({'calories': '1,200 kcal', 'protein': '6g', 'fat': 2.5, 'sugar': 'n/a'})
+
+    assert (info.calories, info.protein, info.fat, info.sugar) == (1200.0, 6.0, 2.5, None)
+
+
+def test_combined_request_through_stub(photo):
+    with StubServer() as stub:
+        vision = VisionClient(Settings(openai_api_key='stub', openai_base_url=stub.base_url))
+        item = vision.analyze_item(('data:image/jpeg;base64,AAAA', 'low'), ('data:image/jpeg;base64,BBBB', 'high'))
+
+    assert item.name and item.calories is not None
+    assert stub.calls == 1
+
+
+def test_unreadable_label_still_adds_the_product(settings, photo):
+    reply = ('{"name": "Oats", "description": "A bag of oats.", "servingSize": null, "calories": null, '
+             '"protein": null, "carbohydrates": null, "fat": null, "sugar": null}')
+    vision = VisionClient(dataclasses.replace(settings, structured_outputs=False))
+    sent = []
+
+    def create(messages, max_tokens):
+        sent.append(messages)
+        message = SimpleNamespace(content=reply)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+    vision._create = create
+    client = create_app(settings, client=vision).test_client()
+    label = make_photo(2, size=(400, 300))
+    response = client.post('/analyze/item', data=files(photo, label))
+
+    assert response.status_code == 200
+    assert (response.get_json()['name'], response.get_json()['calories']) == ('Oats', None)
+    assert len(sent) == 1
+    # The product is cached; the empty label is not
+    assert client.post('/analyze/product', data={'image': (io.BytesIO(photo), 'p.jpg')}).headers['X-Cache'] == 'hit'
+    assert client.post('/analyze/item', data=files(photo, label)).headers['X-Cache'] == 'product=hit, nutrition=miss'
@@ -0,0 +1,80 @@
+import base64
+import io
+
+from server.bench.fixtures import make_photo
+
+
+def new_list(client, name='Weekly Shop'):
+    return client.post('/lists', json={'name': name}).get_json()['id']
+
+
+def test_items_are_added_updated_and_deleted_individually(client):
+    list_id = new_list(client)
+    milk = client.post(f'/lists/{list_id}/items', json={
+        'name': 'Milk', 'barcode': '5000112637922', 'price': '3.49', 'quantity': '2',
+        'nutritionInfo': {'servingSize': '1 cup', 'calories': '120', 'protein': '8g'},
+    }).get_json()
+    eggs = client.post(f'/lists/{list_id}/items', json={'name': 'Eggs', 'price': 4.0, 'quantity': 1}).get_json()
+
+    assert (milk['price'], milk['quantity'], milk['nutritionInfo']['protein']) == (3.49, 2, 8.0)
+    assert milk['barcode'] == '5000112637922' and 'barcode' not in milk['nutritionInfo']
+    assert eggs['nutritionInfo'] is None
+
+    updated = client.patch(f'/lists/{list_id}/items/{milk["id"]}', json={'quantity': 3}).get_json()
+    assert updated['quantity'] == 3 and updated['price'] == 3.49
+
+    assert client.delete(f'/lists/{list_id}/items/{eggs["id"]}').status_code == 204
+    loaded = client.get(f'/lists/{list_id}').get_json()
+    assert [item['name'] for item in loaded['items']] == ['Milk']
+    assert client.get('/lists').get_json() == [
+        {'id': list_id, 'name': 'Weekly Shop', 'itemCount': 1, 'updatedAt': loaded['updatedAt']}
+    ]
+
+
+def test_images_are_stored_once_and_referenced_by_hash(client, app):
+    list_id = new_list(client)
+    photo = make_photo(1, size=(200, 150))
+    data_url = 'data:image/jpeg;base64,' + base64.b64encode(photo).decode('ascii')
+
+    first = client.post(f'/lists/{list_id}/items', json={'name': 'A', 'productPhoto': data_url}).get_json()
+    second = client.post(
+        f'/lists/{list_id}/items',
+        data={'item': '{"name": "B"}', 'productPhoto': (io.BytesIO(photo), 'a.jpg')},
+    ).get_json()
+
+    assert first['productImage'] == second['productImage']
+    assert len(list(app.extensions['blobs'].root.rglob('*'))) == 2  # one shard dir, one blob
+    image = client.get(f'/images/{first["productImage"]}')
+    assert image.data == photo and image.mimetype == 'image/jpeg'
+
+
+def test_unknown_image_hash_is_rejected(client):
+    list_id = new_list(client)
+    response = client.post(f'/lists/{list_id}/items', json={'productImage': 'a' * 64})
+
+    assert response.status_code == 400
+
+
+def test_malformed_items_are_a_400(client):
+    list_id = new_list(client)
+    url = f'/lists/{list_id}/items'
+
+    responses = [
+        client.post(url, data={'item': '{"name": "Milk",'}),
+        client.post(url, json=['Milk']),
+        client.post(url, json={'name': 'Milk', 'productImage': 5}),
+    ]
+    assert [response.status_code for response in responses] == [400, 400, 400]
+    assert client.get(f'/lists/{list_id}').get_json()['items'] == []
+
+
+def test_list_names_are_unique_and_delete_cascades(client):
+    list_id = new_list(client)
+    client.post(f'/lists/{list_id}/items', json={'name': 'Milk'})
+
+    assert client.post('/lists', json={'name': 'Weekly Shop'}).status_code == 409
+    assert client.get('/lists?name=Weekly Shop').get_json()[0]['itemCount'] == 1
+    assert client.delete(f'/lists/{list_id}').status_code == 204
+    assert client.get('/lists?name=Weekly Shop').get_json() == []
+    assert client.get(f'/lists/{list_id}').status_code == 404
+    assert client.post(f'/lists/{list_id}/items', json={'name': 'Milk'}).status_code == 404
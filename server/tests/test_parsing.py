@@ -0,0 +1,144 @@
+from types import SimpleNamespace
+
+import pytest
+
+from server.config import Settings
+from server.errors import AnalysisError, RateLimitedError
+from server.parsing import ResponseParser, parse_locally, response_format
+from server.ratelimit import RateLimiter
+from server.schemas import ItemAnalysis, NutritionInfo, ProductInfo
+from server.vision import VisionClient
+
+
+@pytest.mark.parametrize('content', [
+    '```json\n{"name": "Oats", "description": "A bag of oats."}\n```',
+    'Here you go:\n{"name": "Oats", "description": "A bag of oats."} Hope that helps!',
+    '{"name": "Oats", "description": "A bag of oats.",}',
+    "{'name': 'Oats', 'description': 'A bag of oats.', 'barcode': None}",
+    '{“name”: “Oats”, “description”: “A bag of oats.”}',
+    '{"product": {"name": "Oats", "description": "A bag of oats."}}',
+    '{"product_name": "Oats", "description": "A bag of oats."}',
+])
+def test_local_repairs(content):
+    product, _ = parse_locally(content, ProductInfo)
+    assert (product.name, product.description) == ('Oats', 'A bag of oats.')
+
+
+def test_nested_objects_are_merged_with_top_level_keys():
+    item, _ = parse_locally('{"product": "Oats", "nutrition": {"calories": 100, "fat": "3g"}}', ItemAnalysis)
+    assert (item.name, item.calories, item.fat) == ('Oats', 100, 3)
+
+    item, _ = parse_locally('{"name": "Oats", "item": {"name": "Ignored", "sugar": 1}}', ItemAnalysis)
+    assert (item.name, item.sugar) == ('Oats', 1)
+
+
+def test_numbers_in_text_fields_are_clean():
+    product, repaired = parse_locally('{"name": "Oats", "barcode": 12345678905}', ProductInfo)
+    assert (product.barcode, repaired) == ('12345678905', False)
+
+    nutrition, repaired = parse_locally('{"servingSize": 30, "calories": 100, "protein": "12gr", '
+                                        '"fat": "3 grams", "sugar": "500 milligrams"}', NutritionInfo)
+    assert (nutrition.servingSize, nutrition.protein, nutrition.fat, nutrition.sugar) == ('30', 12, 3, 0.5)
+    assert not repaired
+
+
+def test_truncated_reply_keeps_what_arrived():
+    item, repaired = parse_locally('{"name": "Hummus", "servingSize": "2 tbsp (30g)", "calories": 70, "sug', ItemAnalysis)
+    assert repaired
+    assert (item.name, item.calories, item.sugar, item.servingGrams) == ('Hummus', 70, None, 30)
+
+
+def test_units_are_normalised():
+    nutrition, _ = parse_locally(
+        '{"serving_size": "1 oz", "energy": "1046 kJ", "protein": "9,5 g", '
+        '"total_fat": "1,200mg", "sugars": "500 mcg", "carbs": 12}',
+        NutritionInfo,
+    )
+    assert nutrition.servingGrams == 28.3
+    assert (nutrition.calories, nutrition.protein, nutrition.fat) == (250.0, 9.5, 1.2)
+    assert (nutrition.sugar, nutrition.carbohydrates) == (0.0005, 12)
+    assert NutritionInfo(servingSize='8 fl oz (240 mL)').servingGrams is None
+    assert NutritionInfo(calories='840 kJ / 200 kcal').calories == 200
+
+
+@pytest.mark.parametrize('content, model', [
+    ('{"error": "I cannot read this photo"}', ProductInfo),
+    ('{}', ProductInfo),
+    ('{"name": null, "description": "A blurry photo."}', ProductInfo),
+    ('{"name": null, "calories": null}', ItemAnalysis),
+])
+def test_replies_without_content_are_not_clean(content, model):
+    assert parse_locally(content, model) == (None, None)
+    # Data the app sends itself may still be partial
+    assert model.model_validate_json(content)
+
+    parser = ResponseParser()
+    with pytest.raises(AnalysisError, match='no usable'):
+        parser.parse(content, model, repair=lambda reply, schema: (reply, 10))
+    assert (parser.stats.clean, parser.stats.failed, parser.stats.failure_rate) == (0, 1, 1.0)
+
+
+def test_unreadable_label_keeps_the_product():
+    reply = ('{"name": "Oats", "description": "A bag of oats.", "servingSize": null, "calories": null, '
+             '"protein": null, "carbohydrates": null, "fat": null, "sugar": null}')
+    item, repaired = parse_locally(reply, ItemAnalysis)
+    assert (item.name, item.calories, repaired) == ('Oats', None, False)
+    # A label on its own that could not be read is an answer too, just not a cached one
+    assert parse_locally('{"servingSize": null, "calories": null}', NutritionInfo)[0].calories is None
+
+
+def test_model_repair_is_text_only_and_counted():
+    calls = []
+
+    def repair(content, schema):
+        calls.append((content, schema))
+        return '{"name": "Oats", "description": null}', 60
+
+    parser = ResponseParser()
+    product = parser.parse('It looks like a bag of oats.', ProductInfo, repair=repair, request_tokens=900)
+    parser.parse('{"name": "Milk"}', ProductInfo, repair=repair, request_tokens=900)
+    parser.parse('{"name": "Rice",}', ProductInfo, repair=repair, request_tokens=900)
+
+    assert product.name == 'Oats'
+    assert calls == [('It looks like a bag of oats.', ProductInfo)]
+    stats = parser.stats.as_dict()
+    assert (stats['clean'], stats['repaired_locally'], stats['repaired_by_model']) == (1, 1, 1)
+    assert (stats['repair_tokens'], stats['tokens_saved'], stats['failure_rate']) == (60, 900 + 840, 0.6667)
+
+    with pytest.raises(AnalysisError):
+        parser.parse('still not json', ProductInfo, repair=lambda content, schema: ('nope', 10))
+    with pytest.raises(AnalysisError, match='parse response as JSON'):
+        parser.parse('still not json', ProductInfo)
+    assert parser.stats.failed == 2
+
+
+def test_rate_limited_repair_retries_only_itself():
+    client = VisionClient(Settings(openai_api_key='test', structured_outputs=False),
+                          limiter=RateLimiter(max_retries=2, sleep=lambda delay: None))
+    sent = []
+
+    def create(messages, max_tokens):
+        images = [part for part in messages[0]['content'] if part['type'] == 'image_url']
+        sent.append('image' if images else 'repair')
+        if sent == ['image', 'repair']:
+            raise RateLimitedError('429')
+        content = 'Oats, I think' if images else '{"name": "Oats"}'
+        message = SimpleNamespace(content=content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+    client._create = create
+    assert client.analyze('product', 'data:image/jpeg;base64,AA==')['name'] == 'Oats'
+    assert sent == ['image', 'repair', 'repair']
+    assert (client.parser.stats.repaired_by_model, client.parser.stats.failed) == (1, 0)
+
+
+def test_response_format_is_strict():
+    schema = response_format(NutritionInfo)['json_schema']['schema']
+    assert schema['required'] == list(NutritionInfo.model_fields)
+    assert schema['additionalProperties'] is False
+    assert 'servingGrams' not in schema['properties']
+    assert 'default' not in str(schema)
+
+
+def test_parsing_stats_endpoint(client):
+    assert client.get('/analyze/parsing').get_json()['replies'] == 0
@@ -0,0 +1,57 @@
+import io
+
+from PIL import Image
+
+from server.bench.fixtures import make_photo
+from server.preprocess import PROFILES, prepare
+
+
+def test_product_is_shrunk_to_its_budget():
+    prepared = prepare(io.BytesIO(make_photo(3, size=(4032, 3024))), PROFILES['product'])
+    out = Image.open(io.BytesIO(prepared.data))
+
+    assert max(out.size) == 512
+    assert out.mode == 'RGB'
+    assert out.info.get('progressive') == 1
+    assert prepared.detail == 'low'
+    assert len(prepared.data) < prepared.source_bytes / 10
+
+
+def test_label_keeps_more_detail_and_goes_grayscale():
+    prepared = prepare(io.BytesIO(make_photo(3, size=(4032, 3024))), PROFILES['nutrition'])
+    out = Image.open(io.BytesIO(prepared.data))
+
+    assert max(out.size) == 1536
+    assert out.mode == 'L'
+    # Contrast stretch spans (nearly) the full range
+    low, high = out.getextrema()
+    assert low <= 5 and high >= 250
+
+
+def test_exif_orientation_is_applied():
+    image = Image.open(io.BytesIO(make_photo(4, size=(800, 400))))
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotate 90 CW on display
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', exif=exif)
+    buffer.seek(0)
+
+    prepared = prepare(buffer, PROFILES['product'])
+
+    assert prepared.image.size == (256, 512)
+
+
+def test_small_images_are_not_upscaled_and_webp_works():
+    prepared = prepare(io.BytesIO(make_photo(5, size=(300, 200))), PROFILES['product'], fmt='webp')
+
+    assert prepared.mime == 'image/webp'
+    assert Image.open(io.BytesIO(prepared.data)).size == (300, 200)
+
+
+def test_truncated_upload_is_a_400(client, vision):
+    photo = make_photo(4, size=(800, 600))
+    response = client.post('/analyze/product', data={'image': (io.BytesIO(photo[:len(photo) // 2]), 'p.jpg')})
+
+    assert response.status_code == 400
+    assert 'Could not decode image' in response.get_json()['error']
+    assert vision.calls == []
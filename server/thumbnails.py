@@ -0,0 +1,53 @@
+import os
+import tempfile
+from pathlib import Path
+
+from .errors import APIError
+from .preprocess import Profile, prepare
+
+# Longest side in pixels: 2x the 140px card and 600px viewer for high-DPI screens
+THUMBNAIL_SIZES = {
+    'card': 280,
+    'viewer': 1200,
+}
+
+EXTENSIONS = {'jpeg': '.jpg', 'webp': '.webp'}
+
+
+class ThumbnailCache:
+    """Resized copies of blob-store images, generated on first request and kept on disk.
+
+    Blobs are immutable and named by content hash, so a thumbnail never needs
+    invalidating: the path alone identifies it.
+    """
+
+    def __init__(self, blobs, root, fmt='jpeg'):
+        self.blobs = blobs
+        self.root = Path(root)
+        self.fmt = fmt
+
+    def path(self, digest, size):
+        if size not in THUMBNAIL_SIZES:
+            raise APIError(f"Unknown size '{size}', expected one of {', '.join(THUMBNAIL_SIZES)}")
+        self.blobs.path(digest)  # validates the hash
+        return self.root / size / digest[:2] / f'{digest}{EXTENSIONS[self.fmt]}'
+
+    def get(self, digest, size):
+        """Return the thumbnail path, rendering it first if needed."""
+        path = self.path(digest, size)
+        if path.exists():
+            return path
+        source = self.blobs.path(digest)
+        if not source.exists():
+            raise APIError('Image not found', 404)
+
+        with open(source, 'rb') as handle:
+            prepared = prepare(handle, Profile(max_side=THUMBNAIL_SIZES[size], detail='auto', quality=80), self.fmt)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Concurrent requests for the same thumbnail each write a temp file;
+        # the rename makes whichever finishes last win with identical bytes
+        fd, tmp = tempfile.mkstemp(dir=path.parent)
+        with os.fdopen(fd, 'wb') as handle:
+            handle.write(prepared.data)
+        os.replace(tmp, path)
+        return path
@@ -0,0 +1,112 @@
+import httpx
+from openai import OpenAI, OpenAIError, RateLimitError
+
+from .errors import AnalysisError, RateLimitedError
+from .instrumentation import record_tokens, stage
+from .parsing import ResponseParser, repair_prompt, response_format
+from .ratelimit import RateLimiter
+from .schemas import ItemAnalysis, NutritionInfo, ProductInfo
+
+PRODUCT_PROMPT = (
+    'Analyze this product image and respond ONLY with a JSON object in this exact format, '
+    'with no additional text or formatting:\n'
+    '{"name": "Product Name", "description": "Brief product description", "barcode": "012345678905"}\n'
+    'Set "barcode" to the UPC/EAN digits only if they are legible, otherwise null.'
+)
+
+NUTRITION_PROMPT = (
+    "Analyze this nutrition label and respond ONLY with a JSON object in this exact format. "
+    "Give calories in kcal and the other nutrients in grams, as plain numbers without units:\n"
+    '{"servingSize": "2.0 oz (56g)", "calories": 200, "protein": 6, "carbohydrates": 39, "fat": 2.5, "sugar": 1}'
+)
+
+ITEM_PROMPT = (
+    "The first image is a grocery product and the second is its nutrition label. "
+    "Respond ONLY with a JSON object in this exact format. Give calories in kcal and the other "
+    "nutrients in grams, as plain numbers without units:\n"
+    '{"name": "Product Name", "description": "Brief product description", "barcode": "012345678905", '
+    '"servingSize": "2.0 oz (56g)", "calories": 200, "protein": 6, "carbohydrates": 39, "fat": 2.5, "sugar": 1}\n'
+    'Set "barcode" to the UPC/EAN digits only if they are legible, otherwise null.'
+)
+
+
+def _retry_after(headers):
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        # Missing, or an HTTP date we do not bother parsing
+        return None
+
+
+class VisionClient:
+    """Thin wrapper around the chat completions vision calls the app makes.
+
+    Every request, image or repair, goes through `limiter` on its own.
+    """
+
+    def __init__(self, settings, parser=None, limiter=None):
+        self.model = settings.model
+        self.structured_outputs = settings.structured_outputs
+        self.parser = parser or ResponseParser()
+        self.limiter = limiter or RateLimiter(max_retries=0)
+        self._client = OpenAI(
+            api_key=settings.openai_api_key or 'missing-key',
+            base_url=settings.openai_base_url,
+            # openai 1.12 passes `proxies=` to httpx, which httpx 0.28 rejects,
+            # so hand it a client we built ourselves
+            http_client=httpx.Client(timeout=settings.request_timeout),
+            # RateLimiter does every retry, through the shared bucket
+            max_retries=0,
+        )
+
+    def _complete(self, prompt, images, max_tokens, schema):
+        """Return `(reply, total_tokens)`.
+
+        `images` is a list of `(data_url, detail)` pairs, sent in order.
+        `schema` is the model the reply should match.
+        """
+        content = [{'type': 'text', 'text': prompt}]
+        content += [{'type': 'image_url', 'image_url': {'url': url, 'detail': detail}} for url, detail in images]
+        options = {'response_format': response_format(schema)} if self.structured_outputs else {}
+        response = self.limiter.call(
+            self._create, messages=[{'role': 'user', 'content': content}], max_tokens=max_tokens, **options
+        )
+        if response.usage is None:
+            return response.choices[0].message.content, 0
+        record_tokens(response.usage.prompt_tokens, response.usage.completion_tokens)
+        return response.choices[0].message.content, response.usage.total_tokens
+
+    def _create(self, **request):
+        try:
+            with stage('model'):
+                return self._client.chat.completions.create(model=self.model, **request)
+        except RateLimitError as error:
+            raise RateLimitedError(
+                f'Model rate limit hit: {error}',
+                retry_after=_retry_after(error.response.headers),
+            ) from error
+        except OpenAIError as error:
+            raise AnalysisError(f'Model request failed: {error}') from error
+
+    def repair(self, content, schema):
+        """Ask for a bad reply to be fixed, sending only its text."""
+        return self._complete(repair_prompt(content, schema), [], 400, schema)
+
+    def _ask(self, prompt, images, max_tokens, schema):
+        content, tokens = self._complete(prompt, images, max_tokens, schema)
+        return self.parser.parse(content, schema, repair=self.repair, request_tokens=tokens)
+
+    def analyze_product(self, data_url, detail='auto'):
+        return self._ask(PRODUCT_PROMPT, [(data_url, detail)], 300, ProductInfo).model_dump()
+
+    def analyze_nutrition(self, data_url, detail='auto'):
+        return self._ask(NUTRITION_PROMPT, [(data_url, detail)], 500, NutritionInfo).model_dump()
+
+    def analyze(self, task, data_url, detail='auto'):
+        if task == 'product':
+            return self.analyze_product(data_url, detail)
+        return self.analyze_nutrition(data_url, detail)
+
+    def analyze_item(self, product, nutrition):
+        """One request for both photos; each argument is a `(data_url, detail)` pair."""
+        return self._ask(ITEM_PROMPT, [product, nutrition], 600, ItemAnalysis)
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useMemo, useCallback } from 'react';
 import { ThemeProvider, createTheme } from '@mui/material/styles';
 import { 
   CssBaseline, 
@@ -24,7 +24,8 @@ import {
   MenuItem,
   ListItemIcon,
   Divider,
-  Paper
+  Paper,
+  Autocomplete
 } from '@mui/material';
 import { PieChart, Pie, Cell, ResponsiveContainer } from 'recharts';
 import AddIcon from '@mui/icons-material/Add';
@@ -36,7 +37,34 @@ import DeleteIcon from '@mui/icons-material/Delete';
 import SaveIcon from '@mui/icons-material/Save';
 import ListIcon from '@mui/icons-material/List';
 import CreateNewFolderIcon from '@mui/icons-material/CreateNewFolder';
-import { analyzeProductImage, analyzeNutritionLabel } from './services/openai';
+import { analyzeItem, ingestBatch } from './services/openai';
+import {
+  listsApiEnabled,
+  fetchLists,
+  loadList,
+  saveList,
+  deleteList,
+  updateListItem,
+  deleteListItem,
+  searchCatalogue
+} from './services/lists';
+
+// One object URL per File, instead of a new one on every render
+const objectUrls = new WeakMap();
+
+const getObjectUrl = (file) => {
+  if (!objectUrls.has(file)) {
+    objectUrls.set(file, URL.createObjectURL(file));
+  }
+  return objectUrls.get(file);
+};
+
+const revokeObjectUrl = (file) => {
+  if (file instanceof File && objectUrls.has(file)) {
+    URL.revokeObjectURL(objectUrls.get(file));
+    objectUrls.delete(file);
+  }
+};
 
 const theme = createTheme({
   palette: {
@@ -128,28 +156,72 @@ function App() {
     nutritionLabel: null,
     nutritionInfo: null,
     description: '',
+    barcode: null,
     isAnalyzing: false,
   });
+  const [catalogueQuery, setCatalogueQuery] = useState('');
+  const [catalogueOptions, setCatalogueOptions] = useState([]);
   const [previewProduct, setPreviewProduct] = useState(null);
   const [previewNutrition, setPreviewNutrition] = useState(null);
   const [error, setError] = useState(null);
   const [editingItem, setEditingItem] = useState(null);
   const [expandedItems, setExpandedItems] = useState(new Set());
+  const [isScanningCart, setIsScanningCart] = useState(false);
+  const [cartError, setCartError] = useState(null);
   
   // New state for list management
   const [currentListName, setCurrentListName] = useState('My List');
   const [listMenuAnchor, setListMenuAnchor] = useState(null);
   const [saveListDialogOpen, setSaveListDialogOpen] = useState(false);
   const [savedLists, setSavedLists] = useState([]);
+  // Server list ids by name, when lists are stored on the API
+  const [listIds, setListIds] = useState({});
+  const [currentListId, setCurrentListId] = useState(null);
+
+  const refreshServerLists = useCallback(async () => {
+    const lists = await fetchLists();
+    setListIds(Object.fromEntries(lists.map(list => [list.name, list.id])));
+    setSavedLists(lists.map(list => list.name));
+  }, []);
 
   // Load saved lists on startup
   useEffect(() => {
+    if (listsApiEnabled) {
+      refreshServerLists().catch(err => console.error('Failed to load saved lists:', err));
+      return;
+    }
     const lists = JSON.parse(localStorage.getItem('groceryLists') || '{}');
     setSavedLists(Object.keys(lists));
-  }, []);
+  }, [refreshServerLists]);
+
+  // Swap in a new set of items, releasing the object URLs of photos that go away
+  const replaceItems = (next) => {
+    const kept = new Set(next.flatMap(item => [item.productPhoto, item.nutritionLabel]));
+    items.forEach(item => {
+      [item.productPhoto, item.nutritionLabel].forEach(photo => {
+        if (!kept.has(photo)) revokeObjectUrl(photo);
+      });
+    });
+    setItems(next);
+  };
 
   // List management functions
-  const handleSaveList = () => {
+  const handleSaveList = async () => {
+    if (listsApiEnabled) {
+      try {
+        const saved = await saveList(currentListName, items, listIds[currentListName]);
+        replaceItems(saved.items);
+        setCurrentListId(saved.listId);
+        // Track the id locally rather than re-fetching every list after each save
+        setListIds(prev => ({ ...prev, [currentListName]: saved.listId }));
+        setSavedLists(prev => (prev.includes(currentListName) ? prev : [...prev, currentListName].sort()));
+      } catch (err) {
+        console.error('Failed to save list:', err);
+      }
+      setSaveListDialogOpen(false);
+      return;
+    }
+
     const lists = JSON.parse(localStorage.getItem('groceryLists') || '{}');
     // Convert File objects to base64 strings before saving
     const itemsToSave = items.map(item => ({
@@ -163,35 +235,89 @@ function App() {
     setSaveListDialogOpen(false);
   };
 
-  const handleLoadList = (listName) => {
+  const handleLoadList = async (listName) => {
+    if (listsApiEnabled) {
+      try {
+        replaceItems(await loadList(listIds[listName]));
+        setCurrentListName(listName);
+        setCurrentListId(listIds[listName]);
+      } catch (err) {
+        console.error('Failed to load list:', err);
+      }
+      setListMenuAnchor(null);
+      return;
+    }
+
     const lists = JSON.parse(localStorage.getItem('groceryLists') || '{}');
     if (lists[listName]) {
       // Items are loaded with base64 strings instead of File objects
-      setItems(lists[listName]);
+      replaceItems(lists[listName]);
       setCurrentListName(listName);
     }
     setListMenuAnchor(null);
   };
 
   const handleNewList = () => {
-    setItems([]);
+    replaceItems([]);
     setCurrentListName('New List');
+    setCurrentListId(null);
     setListMenuAnchor(null);
     setSaveListDialogOpen(true);
   };
 
-  const handleDeleteList = (listName) => {
+  const handleDeleteList = async (listName) => {
+    if (listsApiEnabled) {
+      try {
+        await deleteList(listIds[listName]);
+        await refreshServerLists();
+        if (currentListName === listName) {
+          replaceItems([]);
+          setCurrentListName('New List');
+          setCurrentListId(null);
+        }
+      } catch (err) {
+        console.error('Failed to delete list:', err);
+      }
+      setListMenuAnchor(null);
+      return;
+    }
+
     const lists = JSON.parse(localStorage.getItem('groceryLists') || '{}');
     delete lists[listName];
     localStorage.setItem('groceryLists', JSON.stringify(lists));
     setSavedLists(Object.keys(lists));
     if (currentListName === listName) {
-      setItems([]);
+      replaceItems([]);
       setCurrentListName('New List');
     }
     setListMenuAnchor(null);
   };
 
+  // Suggest products the server already knows as the user types a name
+  useEffect(() => {
+    if (!listsApiEnabled || !catalogueQuery.trim()) {
+      setCatalogueOptions([]);
+      return undefined;
+    }
+    let cancelled = false;
+    searchCatalogue(catalogueQuery)
+      .then(results => { if (!cancelled) setCatalogueOptions(results); })
+      .catch(() => { if (!cancelled) setCatalogueOptions([]); });
+    return () => { cancelled = true; };
+  }, [catalogueQuery]);
+
+  const handleCatalogueSelect = (event, product) => {
+    if (!product || typeof product === 'string') return;
+    setNewItem(prev => ({
+      ...prev,
+      name: product.name,
+      description: product.description || '',
+      barcode: product.barcode || null,
+      nutritionInfo: product.nutritionInfo,
+      fromCatalogue: true
+    }));
+  };
+
   const handleClickOpen = () => {
     setOpen(true);
   };
@@ -206,8 +332,10 @@ function App() {
       nutritionLabel: null,
       nutritionInfo: null,
       description: '',
+      barcode: null,
       isAnalyzing: false,
     });
+    setCatalogueQuery('');
     setPreviewProduct(null);
     setPreviewNutrition(null);
     setError(null);
@@ -239,43 +367,31 @@ function App() {
 
         let updatedItem = { ...newItem };
 
-        // Read product photo
-        if (newItem.productPhoto) {
+        // The API gets the original files; the previews read in handleFileChange
+        // are only used by the in-browser fallback. A product picked from the
+        // catalogue is already identified.
+        if (!newItem.fromCatalogue && (newItem.productPhoto || newItem.nutritionLabel)) {
           try {
-            const productBase64 = await new Promise((resolve) => {
-              const reader = new FileReader();
-              reader.onloadend = () => resolve(reader.result);
-              reader.readAsDataURL(newItem.productPhoto);
-            });
-
-            const productAnalysis = await analyzeProductImage(productBase64);
-            updatedItem = {
-              ...updatedItem,
-              name: productAnalysis.name,
-              description: productAnalysis.description
-            };
+            const { product, nutrition } = await analyzeItem(
+              newItem.productPhoto ? { file: newItem.productPhoto, dataUrl: previewProduct } : null,
+              newItem.nutritionLabel ? { file: newItem.nutritionLabel, dataUrl: previewNutrition } : null
+            );
+            if (product) {
+              updatedItem = {
+                ...updatedItem,
+                name: product.name,
+                description: product.description,
+                barcode: product.barcode
+              };
+            }
+            if (nutrition) {
+              updatedItem = {
+                ...updatedItem,
+                nutritionInfo: nutrition
+              };
+            }
           } catch (err) {
-            setError(`Failed to analyze product photo: ${err.message}`);
-            return;
-          }
-        }
-
-        // Read nutrition label
-        if (newItem.nutritionLabel) {
-          try {
-            const nutritionBase64 = await new Promise((resolve) => {
-              const reader = new FileReader();
-              reader.onloadend = () => resolve(reader.result);
-              reader.readAsDataURL(newItem.nutritionLabel);
-            });
-
-            const nutritionAnalysis = await analyzeNutritionLabel(nutritionBase64);
-            updatedItem = {
-              ...updatedItem,
-              nutritionInfo: nutritionAnalysis
-            };
-          } catch (err) {
-            setError(`Failed to analyze nutrition label: ${err.message}`);
+            setError(err.message);
             return;
           }
         }
@@ -298,6 +414,44 @@ function App() {
     }
   };
 
+  // Bulk "scan a whole cart": items are added to the grid as the server finishes them
+  const handleScanCart = async (event) => {
+    const files = Array.from(event.target.files);
+    event.target.value = '';
+    if (files.length === 0) return;
+
+    const filesByStem = new Map(files.map(file => [file.name.replace(/\.[^.]+$/, ''), file]));
+    setIsScanningCart(true);
+    setCartError(null);
+    try {
+      await ingestBatch(files, (row) => {
+        if (row.done) {
+          if (row.failed > 0) {
+            setCartError(`${row.failed} of ${row.items} items could not be analyzed`);
+          }
+          return;
+        }
+        if (row.status !== 'ok') return;
+        const { product, nutritionInfo } = row;
+        setItems(prev => [...prev, {
+          id: Date.now() + row.index,
+          name: product.name,
+          description: product.description,
+          barcode: product.barcode,
+          price: '0',
+          quantity: '1',
+          productPhoto: filesByStem.get(row.key) || null,
+          nutritionLabel: null,
+          nutritionInfo
+        }]);
+      });
+    } catch (err) {
+      setCartError(err.message);
+    } finally {
+      setIsScanningCart(false);
+    }
+  };
+
   const handleEditNutrition = (itemId) => {
     const item = items.find(item => item.id === itemId);
     if (item) {
@@ -308,6 +462,11 @@ function App() {
   };
 
   const handleSaveNutrition = (itemId) => {
+    const saved = items.find(item => item.id === itemId);
+    if (saved?.serverId && saved.listId === currentListId) {
+      updateListItem(currentListId, saved.serverId, { nutritionInfo: editingItem.nutritionInfo })
+        .catch(err => console.error('Failed to save nutrition:', err));
+    }
     setItems(items.map(item => 
       item.id === itemId ? { ...item, nutritionInfo: editingItem.nutritionInfo } : item
     ));
@@ -341,11 +500,15 @@ function App() {
     });
   };
 
-  const calculateTotal = () => {
-    return items.reduce((total, item) => {
-      return total + (parseFloat(item.price) * parseInt(item.quantity));
-    }, 0).toFixed(2);
-  };
+  // Recomputed only when the items change, not on every render
+  const spending = useMemo(() => {
+    const data = items.map(item => ({
+      name: item.name,
+      value: parseFloat(item.price) * parseInt(item.quantity)
+    }));
+    const total = data.reduce((sum, entry) => sum + entry.value, 0);
+    return { data, total: total.toFixed(2) };
+  }, [items]);
 
   const getImageUrl = (item, type) => {
     if (type === 'product') {
@@ -354,16 +517,25 @@ function App() {
         return item.productPhoto;
       }
       // Otherwise, create a URL from the File object
-      return item.productPhoto ? URL.createObjectURL(item.productPhoto) : 'https://via.placeholder.com/140';
+      return item.productPhoto ? getObjectUrl(item.productPhoto) : 'https://via.placeholder.com/140';
     }
     // Handle nutrition label similarly
     if (typeof item.nutritionLabel === 'string') {
       return item.nutritionLabel;
     }
-    return item.nutritionLabel ? URL.createObjectURL(item.nutritionLabel) : null;
+    return item.nutritionLabel ? getObjectUrl(item.nutritionLabel) : null;
   };
 
   const handleDeleteItem = (itemId) => {
+    const saved = items.find(item => item.id === itemId);
+    if (saved?.serverId && saved.listId === currentListId) {
+      deleteListItem(currentListId, saved.serverId)
+        .catch(err => console.error('Failed to delete item:', err));
+    }
+    if (saved) {
+      revokeObjectUrl(saved.productPhoto);
+      revokeObjectUrl(saved.nutritionLabel);
+    }
     setItems(items.filter(item => item.id !== itemId));
     // If the item being deleted is currently being edited, clear the editing state
     if (editingItem?.id === itemId) {
@@ -489,11 +661,8 @@ function App() {
   };
 
   const SpendingDonut = () => {
-    const total = parseFloat(calculateTotal());
-    const data = items.map(item => ({
-      name: item.name,
-      value: parseFloat(item.price) * parseInt(item.quantity)
-    }));
+    const total = parseFloat(spending.total);
+    const { data } = spending;
 
     const COLORS = ['#007AFF', '#5856D6', '#FF2D55', '#FF9500', '#34C759', '#AF52DE'];
 
@@ -636,16 +805,40 @@ function App() {
             <Typography variant="h6" color="text.primary">
               Items ({items.length})
             </Typography>
-            <Button
-              variant="contained"
-              color="primary"
-              startIcon={<AddIcon />}
-              onClick={handleClickOpen}
-            >
-              Add Item
-            </Button>
+            <Box sx={{ display: 'flex', gap: 1 }}>
+              <Button
+                variant="outlined"
+                color="primary"
+                component="label"
+                startIcon={isScanningCart ? <CircularProgress size={16} /> : <CameraAltIcon />}
+                disabled={isScanningCart}
+              >
+                Scan Cart
+                <input
+                  type="file"
+                  hidden
+                  multiple
+                  accept="image/*"
+                  onChange={handleScanCart}
+                />
+              </Button>
+              <Button
+                variant="contained"
+                color="primary"
+                startIcon={<AddIcon />}
+                onClick={handleClickOpen}
+              >
+                Add Item
+              </Button>
+            </Box>
           </Box>
 
+          {cartError && (
+            <Alert severity="warning" onClose={() => setCartError(null)} sx={{ mb: 2 }}>
+              {cartError}
+            </Alert>
+          )}
+
           <Grid container spacing={2}>
             {items.map((item) => (
               <Grid item xs={12} sm={6} key={item.id}>
@@ -655,6 +848,8 @@ function App() {
                     height="140"
                     image={getImageUrl(item, 'product')}
                     alt={item.name}
+                    loading="lazy"
+                    decoding="async"
                     sx={{ objectFit: 'cover' }}
                   />
                   <CardContent sx={{ p: 2.5 }}>
@@ -750,6 +945,21 @@ function App() {
                   {error}
                 </Alert>
               )}
+              {listsApiEnabled && (
+                <Autocomplete
+                  freeSolo
+                  filterOptions={(options) => options}
+                  options={catalogueOptions}
+                  getOptionLabel={(option) => (typeof option === 'string' ? option : option.name)}
+                  inputValue={catalogueQuery}
+                  onInputChange={(event, value) => setCatalogueQuery(value)}
+                  onChange={handleCatalogueSelect}
+                  disabled={newItem.isAnalyzing}
+                  renderInput={(params) => (
+                    <TextField {...params} margin="dense" label="Find a product you've added before" />
+                  )}
+                />
+              )}
               {newItem.name && (
                 <Typography variant="h6" gutterBottom>
                   {newItem.name}
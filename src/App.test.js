@@ -4,10 +4,20 @@ import '@testing-library/jest-dom';
 import App from './App';
 
 // Mock the OpenAI service
-jest.mock('./services/openai', () => ({
-  analyzeProductImage: jest.fn(),
-  analyzeNutritionLabel: jest.fn(),
-}));
+jest.mock('./services/openai', () => {
+  const analyzeProductImage = jest.fn();
+  const analyzeNutritionLabel = jest.fn();
+  return {
+    analyzeProductImage,
+    analyzeNutritionLabel,
+    // Mirror the real fallback so tests can keep mocking the two analyses
+    analyzeItem: jest.fn(async (product, nutrition) => ({
+      product: product ? await analyzeProductImage(product) : null,
+      nutrition: nutrition ? await analyzeNutritionLabel(nutrition) : null,
+    })),
+    ingestBatch: jest.fn(),
+  };
+});
 
 describe('App Component', () => {
   beforeEach(() => {
@@ -0,0 +1,95 @@
+// Saved lists on the Python API (server/), stored as rows with images kept once
+// by hash. Only used when REACT_APP_ANALYSIS_API_URL is set; otherwise the app
+// keeps using localStorage.
+const API_URL = process.env.REACT_APP_ANALYSIS_API_URL;
+
+export const listsApiEnabled = Boolean(API_URL);
+
+const request = async (path, options = {}) => {
+  const response = await fetch(`${API_URL}${path}`, options);
+  if (response.status === 204) {
+    return null;
+  }
+  const body = await response.json();
+  if (!response.ok) {
+    throw new Error(body.error || `Request failed with status ${response.status}`);
+  }
+  return body;
+};
+
+const sendJson = (method, body) => ({
+  method,
+  headers: { 'Content-Type': 'application/json' },
+  body: JSON.stringify(body)
+});
+
+// `size` is 'card' or 'viewer' for a cached thumbnail; omit it for the original
+export const imageUrl = (hash, size) => {
+  if (!hash) return null;
+  return size ? `${API_URL}/images/${hash}?size=${size}` : `${API_URL}/images/${hash}`;
+};
+
+const fromServer = (listId, item) => ({
+  ...item,
+  id: item.id,
+  serverId: item.id,
+  listId,
+  productPhoto: imageUrl(item.productImage, 'card'),
+  nutritionLabel: imageUrl(item.labelImage)
+});
+
+export const fetchLists = () => request('/lists');
+
+export const loadList = async (listId) => {
+  const list = await request(`/lists/${listId}`);
+  return list.items.map(item => fromServer(list.id, item));
+};
+
+export const deleteList = (listId) => request(`/lists/${listId}`, { method: 'DELETE' });
+
+// Save under `name`, creating the list if needed. `knownId` is the id the app
+// already holds for that name; without one the list is looked up by name,
+// which costs the same however many lists exist. Only items not already
+// stored in that list are sent; edits and deletes go through the item calls.
+export const saveList = async (name, items, knownId = null) => {
+  let listId = knownId;
+  if (!listId) {
+    const [existing] = await request(`/lists?name=${encodeURIComponent(name)}`);
+    listId = existing ? existing.id : (await request('/lists', sendJson('POST', { name }))).id;
+  }
+
+  const saved = [];
+  for (const item of items) {
+    if (item.listId === listId) {
+      saved.push(item);
+      continue;
+    }
+    const form = new FormData();
+    form.append('item', JSON.stringify({
+      name: item.name,
+      description: item.description,
+      barcode: item.barcode,
+      price: item.price,
+      quantity: item.quantity,
+      nutritionInfo: item.nutritionInfo,
+      // Reuse blobs the server already has when copying between lists
+      productImage: item.productImage,
+      labelImage: item.labelImage
+    }));
+    if (item.productPhoto instanceof File) form.append('productPhoto', item.productPhoto);
+    if (item.nutritionLabel instanceof File) form.append('nutritionLabel', item.nutritionLabel);
+    const stored = await request(`/lists/${listId}/items`, { method: 'POST', body: form });
+    saved.push(fromServer(listId, stored));
+  }
+  return { listId, items: saved };
+};
+
+export const updateListItem = (listId, itemId, fields) =>
+  request(`/lists/${listId}/items/${itemId}`, sendJson('PATCH', fields));
+
+export const deleteListItem = (listId, itemId) =>
+  request(`/lists/${listId}/items/${itemId}`, { method: 'DELETE' });
+
+// Products the server has identified before, for instant add-item suggestions
+export const searchCatalogue = (query, limit = 8) =>
+  request(`/catalogue/search?q=${encodeURIComponent(query)}&limit=${limit}`);
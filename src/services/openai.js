@@ -5,6 +5,48 @@ const openai = new OpenAI({
   dangerouslyAllowBrowser: true // Enable browser usage
 });
 
+// When set, image analysis goes through the Python API (server/), which caches
+// results by image hash so re-scanning a product never reaches the model
+const ANALYSIS_API_URL = process.env.REACT_APP_ANALYSIS_API_URL;
+
+// An Error for a failed API response, naming its trace id so the failure can
+// be matched to the server's timings and profiles
+const apiError = (response, body) => {
+  const trace = response.headers.get('X-Trace-Id');
+  const message = body.error || `Request failed with status ${response.status}`;
+  return new Error(trace ? `${message} (trace ${trace})` : message);
+};
+
+// `payload` is a FormData of image files (streamed to the server as multipart)
+// or a plain object sent as JSON
+const postToAnalysisApi = async (path, payload) => {
+  const options = payload instanceof FormData
+    ? { method: 'POST', body: payload }
+    : { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify(payload) };
+  const response = await fetch(`${ANALYSIS_API_URL}${path}`, options);
+  const body = await response.json();
+  if (!response.ok) {
+    throw apiError(response, body);
+  }
+  return body;
+};
+
+// What belongs in an item's nutritionInfo; name, description, barcode and
+// derived values such as servingGrams stay out of it
+const NUTRIENTS = ['calories', 'protein', 'carbohydrates', 'fat', 'sugar'];
+const NUTRITION_FIELDS = ['servingSize', ...NUTRIENTS];
+
+// Split a flat item analysis from the API into product fields and nutritionInfo.
+// nutritionInfo is null when no nutrient was read, as it is for saved items
+// without a label, so the card hides the section instead of showing zeros.
+const splitAnalysis = ({ name, description, barcode, ...rest }) => {
+  const read = NUTRIENTS.filter(nutrient => rest[nutrient] !== null && rest[nutrient] !== undefined);
+  return {
+    product: { name, description, barcode: barcode || null },
+    nutritionInfo: read.length > 0 ? Object.fromEntries(NUTRITION_FIELDS.map(field => [field, rest[field] ?? null])) : null
+  };
+};
+
 const parseOpenAIResponse = (content) => {
   try {
     // Remove any markdown formatting that might be present
@@ -17,6 +59,10 @@ const parseOpenAIResponse = (content) => {
 
 export const analyzeProductImage = async (imageBase64) => {
   try {
+    if (ANALYSIS_API_URL) {
+      return await postToAnalysisApi('/analyze/product', { image: imageBase64 });
+    }
+
     const response = await openai.chat.completions.create({
       model: "gpt-4o",
       messages: [
@@ -48,6 +94,10 @@ export const analyzeProductImage = async (imageBase64) => {
 
 export const analyzeNutritionLabel = async (imageBase64) => {
   try {
+    if (ANALYSIS_API_URL) {
+      return await postToAnalysisApi('/analyze/nutrition', { image: imageBase64 });
+    }
+
     const response = await openai.chat.completions.create({
       model: "gpt-4o",
       messages: [
@@ -85,4 +135,62 @@ export const analyzeNutritionLabel = async (imageBase64) => {
     console.error('Error analyzing nutrition label:', error);
     throw new Error(`Failed to analyze nutrition label: ${error.message}`);
   }
-}; 
\ No newline at end of file
+};
+
+// Analyse both photos for one item. The Python API does this in a single model
+// request; without it the two analyses at least run concurrently. Each photo
+// is `{ file, dataUrl }` or null: the API is sent the original file, the
+// in-browser fallback needs the data URL.
+export const analyzeItem = async (product, nutrition) => {
+  if (ANALYSIS_API_URL) {
+    try {
+      const form = new FormData();
+      if (product) form.append('product', product.file);
+      if (nutrition) form.append('nutrition', nutrition.file);
+      const analysis = splitAnalysis(await postToAnalysisApi('/analyze/item', form));
+      return {
+        product: product ? analysis.product : null,
+        nutrition: nutrition ? analysis.nutritionInfo : null
+      };
+    } catch (error) {
+      console.error('Error analyzing item:', error);
+      throw new Error(`Failed to analyze item photos: ${error.message}`);
+    }
+  }
+
+  const [productInfo, nutritionInfo] = await Promise.all([
+    product ? analyzeProductImage(product.dataUrl) : null,
+    nutrition ? analyzeNutritionLabel(nutrition.dataUrl) : null
+  ]);
+  return { product: productInfo, nutrition: nutritionInfo };
+};
+
+// Upload a whole cart of photos to the Python API and call `onRow` with each
+// parsed item as soon as the server streams it back (NDJSON, one row per line).
+// Analysed rows get `product` and `nutritionInfo` split out of `item`.
+export const ingestBatch = async (files, onRow) => {
+  if (!ANALYSIS_API_URL) {
+    throw new Error('Scanning a whole cart needs REACT_APP_ANALYSIS_API_URL to be set');
+  }
+  const form = new FormData();
+  files.forEach(file => form.append('files', file));
+  const response = await fetch(`${ANALYSIS_API_URL}/ingest/batch`, { method: 'POST', body: form });
+  if (!response.ok) {
+    throw apiError(response, await response.json());
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const lines = buffer.split('\n');
+    buffer = lines.pop();
+    lines.filter(Boolean).forEach(line => {
+      const row = JSON.parse(line);
+      onRow(row.item ? { ...row, ...splitAnalysis(row.item) } : row);
+    });
+  }
+};